@@ -1,25 +1,34 @@
 import math
 import os
+import time
 import torch
-from botorch.models import SingleTaskGP, FixedNoiseGP
+from botorch.models import SingleTaskGP, FixedNoiseGP, MultiTaskGP, FixedNoiseMultiTaskGP, SingleTaskVariationalGP
+from botorch.models import ApproximateGPyTorchModel
 from botorch.fit import fit_gpytorch_model
-from gpytorch.mlls import ExactMarginalLogLikelihood
-from botorch.acquisition import ExpectedImprovement, qExpectedImprovement, qNoisyExpectedImprovement
-from botorch.acquisition.analytic import ProbabilityOfImprovement
+from gpytorch.mlls import ExactMarginalLogLikelihood, VariationalELBO
+from botorch.acquisition.monte_carlo import MCAcquisitionFunction
+from botorch.acquisition.penalized import PenalizedAcquisitionFunction
 from gpytorch.likelihoods import GaussianLikelihood
 from gpytorch.constraints import GreaterThan, Interval
-from botorch.sampling import IIDNormalSampler
 from botorch.optim import optimize_acqf
+from botorch.optim.fit import fit_gpytorch_mll_scipy
+from botorch.optim.initializers import gen_batch_initial_conditions
+from botorch.utils.sampling import draw_sobol_samples
 
 # local imports
 from HIL.optimization.kernel import SE, Matern 
+from HIL.optimization.session_store import SessionStore, load_session, session_paths
+from HIL.optimization.transfer import TransferPrior
+from HIL.optimization.trust_region import TrustRegion
+from HIL.optimization.acquisition import ACQUISITIONS, TravelPenalizedAcquisition, build_acquisition, minimal_travel, penalize_travel
 
 import numpy as np
 import matplotlib.pyplot as plt
 
 # utils
 import logging
-from typing import Any, Optional, Tuple, Dict
+from functools import partial
+from typing import Any, Callable, List, Optional, Tuple, Dict
 
     
 
@@ -32,26 +41,54 @@ class BayesianOptimization(object):
     Bayesian Optimization class for HIL
     """
     def __init__(self, n_parms:int = 1, range: np.ndarray = np.array([0,1]), noise_range :np.ndarray = np.array([0.005, 10]), acq: str = "ei",
-        Kernel: str = "SE", model_save_path : str = "", device : str = "cpu" , plot: bool = False, kernel_parms: Dict = {}) -> None:
+        Kernel: str = "SE", model_save_path : str = "", device : str = "cpu" , plot: bool = False, kernel_parms: Dict = {},
+        fitter: str = "adam", max_iter: int = 500, tol: float = 1e-4, warm_start: bool = True,
+        num_restarts: Optional[int] = None, raw_samples: Optional[int] = None, acq_time_budget: Optional[float] = None,
+        refit_every: int = 1, mll_drift: float = 1.0, prior: Optional[TransferPrior] = None, ucb_beta: float = 2.0,
+        switching_cost: float = 0.0, travel_order: bool = False, trust_region: Optional[Dict] = None,
+        backend: str = "exact", svgp: Optional[Dict] = None) -> None:
         """Bayesian optimization for HIL
 
         Args:
             n_parms (int, optional): Number of optimization parameters ( exoskeleton parameters). Defaults to 1.
             range (np.ndarray, optional): Range of the optimization parameters. Defaults to np.array([0,1]).
             noise_range (np.ndarray, optional): Range of noise contraints for optimization. Defaults to np.array([0.005, 10]).
-            acq (str, optional): Selecting acquisition function, options are 'ei', 'pi'. Defaults to "ei".
+            acq (str, optional): Selecting acquisition function, analytic 'ei', 'logei', 'pi', 'ucb' or quasi Monte-Carlo
+                'qei', 'qnei', 'qpi', 'qucb' (see HIL.optimization.acquisition). Defaults to "ei".
             Kernel (str, optional): Selecting kernel for the GP, options are "SE", "Matern". Defaults to "SE".
             model_save_path (str, optional): Path the new optimization saving directory. Defaults to "".
             device (str, optional): which device to perform optimization, "gpu", "cuda" or "cpu". Defaults to "cpu".
             plot (bool, optional): options to plot the gp and acquisition points. Defaults to False.
+            fitter (str, optional): Hyperparameter fitter, options are "adam", "lbfgs" (scipy). Defaults to "adam".
+            max_iter (int, optional): Maximum number of fitting iterations. Defaults to 500.
+            tol (float, optional): Relative loss change below which the fit is considered converged. Defaults to 1e-4.
+            warm_start (bool, optional): Start each fit from the previous iteration's hyperparameters. Defaults to True.
+            num_restarts (int, optional): Acquisition optimization restarts, None scales it with n_parms. Defaults to None.
+            raw_samples (int, optional): Raw samples for the initial conditions, None scales it with n_parms. Defaults to None.
+            acq_time_budget (float, optional): Wall clock budget (s) of the acquisition optimization. Defaults to None.
+            refit_every (int, optional): Refit the hyperparameters every N new points, in between the points are
+                added to the GP with the hyperparameters fixed. Defaults to 1.
+            mll_drift (float, optional): Refit earlier once the average predictive log likelihood of the new points falls
+                this much below the marginal log likelihood (per point) of the last fit. Defaults to 1.0.
+            prior (TransferPrior, optional): Hyperpriors from the sessions of previous subjects. Defaults to None.
+            ucb_beta (float, optional): Exploration weight of the upper confidence bound. Defaults to 2.0.
+            switching_cost (float, optional): Penalty of the travel from the applied parameter (the last observed one),
+                relative to the spread of the acquisition over the range, the travel is relative to the range. Candidates
+                duplicating the applied parameter are rejected. Defaults to 0.0.
+            travel_order (bool, optional): Order the parameters of a batch for the least travel. Defaults to False.
+            trust_region (Dict, optional): Optimize the acquisition in a TuRBO style trust region around the incumbent,
+                the TrustRegion arguments, None for the whole range. Defaults to None.
+            backend (str, optional): GP model, "exact" or "svgp" (sparse variational GP with inducing points, trained
+                in minibatches, for pooled datasets of thousands of observations). Defaults to "exact".
+            svgp (Dict, optional): options of the svgp backend, inducing_points, minibatch_size, epochs and lr. Defaults to None.
         """
         # TODO have an options of sending in the kernel parameters.
         if Kernel == "SE":
-            self.kernel = SE()
+            self.kernel = SE(n_parms)
             self.covar_module = self.kernel.get_covr_module()
 
         else:
-            self.kernel = Matern()
+            self.kernel = Matern(n_parms)
             self.covar_module = self.kernel.get_covr_module()
         
         self.n_parms = n_parms
@@ -63,6 +100,9 @@ class BayesianOptimization(object):
             # this is temp
             self.model_save_path = "tmp_data/"
 
+        # append-only store with one record per optimization step
+        self.store = SessionStore(SessionStore.new_path(self.model_save_path))
+
         
 
         # place holder for model
@@ -71,6 +111,10 @@ class BayesianOptimization(object):
         # place to store the parameters
         self.x = torch.tensor([])
         self.y = torch.tensor([])
+        # known noise variance of every observation, None to learn one noise level
+        self.y_var: Optional[torch.Tensor] = None
+        # fidelity (task) of every observation, 0 the target cost and the others cheap proxies, None for one fidelity
+        self.fidelity: Optional[torch.Tensor] = None
 
         # device 
         self.device = device
@@ -85,72 +129,284 @@ class BayesianOptimization(object):
         self._noise_constraints = noise_range 
         self.likelihood = GaussianLikelihood() #noise_constraint=Interval(self._noise_constraints[0], self._noise_constraints[1]))
 
-        # number of sampling in the acquisition points
-        self.N_POINTS = 200
+        # quasi Monte-Carlo samples of the q acquisition functions, a power of 2 for the Sobol sequence
+        self.N_POINTS = 256
+
+        # candidate grid over the parameter range, its posterior is cached until the model changes
+        self.N_GRID = 1000 # approximate number of grid points, split evenly over the parameters
+        self.GRID_BATCH = 512 # grid points per posterior evaluation
+        self._grid: Optional[torch.Tensor] = None
+        self._grid_posterior: Optional[Tuple[torch.Tensor, torch.Tensor]] = None
 
         # acquisition function type
+        if acq not in ACQUISITIONS:
+            raise ValueError(f"acquisition {acq} is not one of {list(ACQUISITIONS)}")
         self.acq_type = acq
+        self.ucb_beta = ucb_beta
+        # large changes of the parameter lengthen the transient of the next bout
+        self.switching_cost = switching_cost
+        self.travel_order = travel_order
+
+        # local optimization for more parameters, the region follows the successes of the steps
+        self.trust_region = TrustRegion(n_parms, **trust_region) if trust_region else None
+
+        # hyperparameter fitting
+        self.fitter = fitter
+        self.max_iter = max_iter
+        self.tol = tol
+        self.warm_start = warm_start
+        # number of consecutive iterations under tol before adam stops
+        self.FIT_PATIENCE = 10
+        # hyperparameters of the last fit, used to warm start the next one
+        self.hyper_state: Optional[Dict[str, torch.Tensor]] = None
+        # report of the last fit (fitter, iterations, time, loss)
+        self.fit_info: Dict[str, Any] = {}
+        # wall time (s) of the last step
+        self.step_time = 0.0
+        # convergence diagnostics of the last step (acquisition value, step distance, incumbent std)
+        self.diagnostics: Dict[str, float] = {}
+        self._previous_proposal: Optional[torch.Tensor] = None
+
+        # acquisition optimization budget, scaled with the number of parameters when not given
+        self.num_restarts = num_restarts
+        self.raw_samples = raw_samples
+        self.acq_time_budget = acq_time_budget
+        self.RESTARTS_PER_PARM = 8
+        self.MAX_RESTARTS = 64
+        self.RAW_SAMPLES_PER_PARM = 256
+        self.MAX_RAW_SAMPLES = 2048
+        # best candidates of the previous optimization, used as seeds for the next one
+        self.N_SEEDS = 4
+        self._seed_candidates: Optional[torch.Tensor] = None
+        # candidates closer than this (relative to the range) to the applied or a pending parameter are duplicates
+        self.DUPLICATE_TOL = 1e-3
+        # report of the last acquisition optimization (restarts, raw samples, time, value)
+        self.acq_info: Dict[str, Any] = {}
+
+        # speculative lookahead: next parameters precomputed for possible outcomes of the pending bout
+        self.LOOKAHEAD_SPREAD = 1.5 # outcomes span mean +- spread * std of the pending bout
+        self.LOOKAHEAD_REFINE_ITER = 20 # optimizer iterations to refine the precomputed candidates
+        self._lookahead: Optional[Dict[str, torch.Tensor]] = None
 
-    def _step(self) -> np.ndarray:
+        # incremental updates: new points are conditioned on with fixed hyperparameters until a refit is due
+        self.refit_every = refit_every
+        self.mll_drift = mll_drift
+        self._n_since_fit = 0
+        self._fit_mll = math.nan
+        self._predictive_ll: list = []
+
+        # informative prior from previous subjects, None for the default flat start
+        self.prior = prior
+
+        # sparse variational backend, the cost of a fit grows with the minibatches instead of the cube of the data
+        if backend not in ("exact", "svgp"):
+            raise ValueError(f"backend {backend} is not one of ['exact', 'svgp']")
+        self.backend = backend
+        svgp = svgp or {}
+        self.N_INDUCING = svgp.get("inducing_points", 128)
+        self.MINIBATCH_SIZE = svgp.get("minibatch_size", 512)
+        self.SVGP_EPOCHS = svgp.get("epochs", 30)
+        self.SVGP_LR = svgp.get("lr", 0.1)
+
+    def _step(self, fit: Optional[Callable[[], Tuple[torch.Tensor, torch.Tensor]]] = None) -> np.ndarray:
         """ Fit the model and identify the next parameter, also plots the model if plot is true
 
+        Args:
+            fit (Callable, optional): function returning the next parameter and its acquisition value. Defaults to self._fit.
+
         Returns:
             np.ndarray: Next parameter to sampled
         """
 
-        parameter, value = self._fit()
+        start = time.perf_counter()
+        parameter, value = (fit or self._fit)()
         new_parameter = parameter.detach().cpu().numpy()
+        self.step_time = time.perf_counter() - start
 
         self.logger.info(f"Next parameter is {new_parameter}")
+        best_parameter, best_value = self.predicted_best()
+        self.logger.info(f"Predicted best parameter is {best_parameter} with value {best_value}")
+        self.diagnostics = self._diagnostics(parameter.detach())
+        self.logger.info(f"convergence diagnostics {self.diagnostics}")
 
-        self._save_model()
+        self._save_model(new_parameter)
 
         if self.PLOT:
             self._plot()
 
         return new_parameter
 
-    def _get_data_best(self) -> float:
-        """Get the best value predicted by the model
+    @property
+    def grid(self) -> torch.Tensor:
+        """Candidate grid over the parameter range, about N_GRID points split evenly over the parameters
 
         Returns:
-            float: best value
+            torch.Tensor: grid points x n_parms
         """
-        
-        range = np.arange(self.range[0,:], self.range[1,:], self.N_POINTS)
-        range = torch.tensor(range)
-        self.model.eval() #type: ignore
-        output = self.model(range)     #type: ignore
-        return torch.max(output).detach().numpy() #type: ignore
+        if self._grid is None:
+            n_axis = max(2, math.ceil(self.N_GRID ** (1 / self.n_parms)))
+            axes = [torch.linspace(self.range[0, i], self.range[1, i], n_axis, dtype=torch.double) for i in range(self.n_parms)]
+            self._grid = torch.cartesian_prod(*axes).reshape(-1, self.n_parms).to(self.device)
+        return self._grid
+
+    def grid_posterior(self, model: Any = None) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Posterior mean and variance on the candidate grid, evaluated in batches without gradients.
+        The result for self.model is cached until the model changes.
+
+        Args:
+            model (Any, optional): model to evaluate. Defaults to self.model.
+
+        Returns:
+            Tuple[torch.Tensor, torch.Tensor]: mean, variance on the grid
+        """
+        if model is None and self._grid_posterior is not None:
+            return self._grid_posterior
+
+        evaluated = model if model is not None else self.model
+        evaluated.eval() #type: ignore
+        means, variances = [], []
+        with torch.no_grad():
+            for points in torch.split(self.grid, self.GRID_BATCH):
+                posterior = evaluated.posterior(points.to(self._train_inputs(evaluated))) #type: ignore
+                means.append(posterior.mean.squeeze(-1))
+                variances.append(posterior.variance.squeeze(-1))
+        result = (torch.cat(means), torch.cat(variances))
+        if model is None:
+            self._grid_posterior = result
+        return result
 
-    def _training(self, model, likelihood,train_x,train_y):
+    def predicted_best(self) -> Tuple[np.ndarray, float]:
+        """Best parameter and value of the posterior mean on the candidate grid
 
+        Returns:
+            Tuple[np.ndarray, float]: parameter, predicted value
         """
-        Train the model using Adam Optimizer and gradient descent
-        Log Marginal Likelihood is used as the cost function
+        mean, _ = self.grid_posterior()
+        best = torch.argmax(mean)
+        return self.grid[best].cpu().numpy(), mean[best].item()
+
+    def _diagnostics(self, proposed: torch.Tensor) -> Dict[str, float]:
+        """Convergence diagnostics of a step: maximum acquisition value, distance between the first proposed
+        parameter and the previous one (relative to the range, NaN for the first step) and posterior std
+        at the predicted best (best posterior mean on the grid, see predicted_best). The acquisition measures the
+        improvement from the best posterior mean at the observed parameters instead (see _incumbent)
+
+        Args:
+            proposed (torch.Tensor): parameters proposed in this step
         """
-           
-        parameter = list(model.parameters()) + list(likelihood.parameters())
-        optimizer = torch.optim.Adam(parameter, lr=0.01) 
-        mll= ExactMarginalLogLikelihood(likelihood, model).to(train_x)
-        
+        proposed = proposed.reshape(-1, self.n_parms)[0]
+        span = torch.tensor(self.range[1] - self.range[0]).to(proposed)
+        distance = math.nan
+        if self._previous_proposal is not None:
+            distance = torch.linalg.norm((proposed - self._previous_proposal) / span).item() / math.sqrt(self.n_parms)
+        self._previous_proposal = proposed
+
+        mean, variance = self.grid_posterior()
+        incumbent = torch.argmax(mean)
+        return {"acquisition": self.acq_info.get("value", math.nan), "step_distance": distance,
+                "incumbent_std": variance[incumbent].clamp_min(0).sqrt().item()}
 
-        train_y=train_y.squeeze(-1)
-        loss = -mll(model(train_x), train_y) #type: ignore
-        self.logger.info("before training Loss: ", loss.item())
-        for i in range(500):
-            
+    def _training(self, model, likelihood, train_x, train_y) -> Dict[str, Any]:
+
+        """
+        Train the model by maximizing the Log Marginal Likelihood, either with Adam
+        (stops early once the loss plateaus) or with scipy L-BFGS.
+
+        Returns:
+            Dict[str, Any]: fitter, number of iterations, wall time (s) and final loss of the fit
+        """
+        if isinstance(model, ApproximateGPyTorchModel):
+            mll = VariationalELBO(likelihood, model.model, num_data=len(train_x)).to(train_x)
+        else:
+            mll = ExactMarginalLogLikelihood(likelihood, model).to(train_x)
+        mll.train()
+        start = time.perf_counter()
+
+        if isinstance(model, ApproximateGPyTorchModel):
+            iterations, loss = self._minibatch_training(mll, model, train_x, train_y.squeeze(-1))
+        elif self.fitter == "lbfgs":
+            result = fit_gpytorch_mll_scipy(mll, options={"maxiter": self.max_iter, "ftol": self.tol})
+            iterations, loss = result.step, result.fval
+        else:
+            iterations, loss = self._adam_training(mll, model, train_x, train_y.squeeze(-1))
+
+        mll.eval()
+        self._grid_posterior = None
+        self.hyper_state = {k: v.detach().clone() for k, v in model.state_dict().items()}
+        self._n_since_fit = 0
+        self._fit_mll = -loss
+        self._predictive_ll = []
+        fitter = "svgp" if isinstance(model, ApproximateGPyTorchModel) else self.fitter
+        fit_info = {"fitter": fitter, "iterations": iterations, "time": time.perf_counter() - start, "loss": loss}
+        self.logger.info(f"fit with {fitter}: {iterations} iterations in {fit_info['time']:.3f} s, loss {loss:.4f}")
+        return fit_info
+
+    def _adam_training(self, mll, model, train_x, train_y) -> Tuple[int, float]:
+        """Gradient descent on the negative marginal log likelihood using Adam, stops when the
+        relative loss change stays below tol for FIT_PATIENCE iterations.
+
+        Returns:
+            Tuple[int, float]: number of iterations, final loss
+        """
+        optimizer = torch.optim.Adam(mll.parameters(), lr=0.01)
+        previous = math.inf
+        stalled = 0
+        i, current = 0, math.nan
+        for i in range(1, self.max_iter + 1):
             optimizer.zero_grad()
             output = model(train_x)
             loss = -mll(output, train_y) #type: ignore
-            
             loss.backward()
             optimizer.step()
-        self.logger.info("after training Loss: ", loss.item()) 
 
-    def _fit(self) -> Tuple[torch.Tensor, torch.Tensor]:
+            current = loss.item()
+            if abs(previous - current) <= self.tol * max(abs(previous), 1.0):
+                stalled += 1
+                if stalled >= self.FIT_PATIENCE:
+                    break
+            else:
+                stalled = 0
+            previous = current
+        return i, current
+
+    def _minibatch_training(self, mll, model, train_x, train_y) -> Tuple[int, float]:
+        """Adam on the negative ELBO of the variational GP over shuffled minibatches of the data, stops when the
+        relative change of the epoch loss stays below tol for FIT_PATIENCE epochs.
+
+        Returns:
+            Tuple[int, float]: number of epochs, final loss (epoch average)
+        """
+        optimizer = torch.optim.Adam(mll.parameters(), lr=self.SVGP_LR)
+        previous = math.inf
+        stalled = 0
+        i, current = 0, math.nan
+        for i in range(1, self.SVGP_EPOCHS + 1):
+            total = 0.0
+            for batch in torch.randperm(len(train_x), device=train_x.device).split(self.MINIBATCH_SIZE):
+                optimizer.zero_grad()
+                output = model.model(train_x[batch])
+                loss = -mll(output, train_y[batch]) #type: ignore
+                loss.backward()
+                optimizer.step()
+                total += loss.item() * len(batch)
+
+            current = total / len(train_x)
+            if abs(previous - current) <= self.tol * max(abs(previous), 1.0):
+                stalled += 1
+                if stalled >= self.FIT_PATIENCE:
+                    break
+            else:
+                stalled = 0
+            previous = current
+        return i, current
+
+    def _fit(self, batch_size: int = 1, x_pending: Optional[np.ndarray] = None) -> Tuple[torch.Tensor, torch.Tensor]:
         """Using the model and likelihood select the next data point to get next data points and acq value at that point
 
+        Args:
+            batch_size (int, optional): number of parameters to propose. Defaults to 1.
+            x_pending (np.ndarray, optional): parameters proposed but not evaluated yet. Defaults to None.
+
         Returns:
             Tuple[torch.tensor, torch.tensor]: next parmaeter, value at the point
         """
@@ -158,94 +414,576 @@ class BayesianOptimization(object):
         # mll = ExactMarginalLogLikelihood(self.likelihood, self.model)
         # fit_gpytorch_model(mll) # check I need to change anything
         # using manual gradient descent using adam optimizer.
-        self._training(self.model, self.likelihood, self.x, self.y)
+        gp = self._gp(self.model)
+        self.fit_info = self._training(self.model, self.likelihood, gp.train_inputs[0], gp.train_targets.unsqueeze(-1)) #type: ignore
+        return self._propose(batch_size, x_pending)
 
-        if self.acq_type == "ei":
-            acq = qNoisyExpectedImprovement(self.model, self.x, sampler=IIDNormalSampler(self.N_POINTS, seed = 1234)) #type: ignore
-        else:
-            # TODO add other acquisition functions
-            best_f = self._get_data_best()
-            acq = ProbabilityOfImprovement(self.model, best_f, sampler=IIDNormalSampler(self.N_POINTS, seed = 1234)) #type: ignore
-            pass
-        new_point, value  = optimize_acqf(
+    def _propose(self, batch_size: int = 1, x_pending: Optional[np.ndarray] = None) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Optimize the acquisition on the current model for one parameter or a batch of parameters
+
+        Returns:
+            Tuple[torch.tensor, torch.tensor]: next parmaeter, value at the point
+        """
+        if batch_size == 1 and x_pending is None:
+            return self._optimize_acquisition(self._acquisition())
+        return self._optimize_batch(self._acquisition(batch=True), batch_size, x_pending)
+
+    def _record_predictive(self, x: torch.Tensor, y: torch.Tensor, y_var: Optional[torch.Tensor] = None) -> None:
+        """Store the predictive log likelihood of new points under the current model, used for the drift check"""
+        self.model.eval() #type: ignore
+        with torch.no_grad():
+            posterior = self.model.posterior(x, observation_noise=y_var if y_var is not None else True) #type: ignore
+            log_likelihood = torch.distributions.Normal(posterior.mean, posterior.variance.sqrt()).log_prob(y)
+        self._predictive_ll.extend(log_likelihood.flatten().tolist())
+        self._n_since_fit += len(x)
+
+    def _refit_due(self) -> bool:
+        """Refit after refit_every new points or when the new points drift from the fitted marginal likelihood"""
+        if self._n_since_fit >= self.refit_every:
+            return True
+        drift = self._fit_mll - np.mean(self._predictive_ll) if len(self._predictive_ll) else 0.0
+        if drift > self.mll_drift:
+            self.logger.info(f"marginal likelihood drift {drift:.3f}, refitting the hyperparameters")
+            return True
+        return False
+
+    def _condition(self, batch_size: int = 1, x_pending: Optional[np.ndarray] = None, n_new: int = 1) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Add the newest points to the GP with the hyperparameters held fixed. gpytorch updates the cached
+        Cholesky factor of the training covariance with a low rank update instead of recomputing it.
+
+        Args:
+            n_new (int, optional): number of new points at the end of x, y. Defaults to 1.
+
+        Returns:
+            Tuple[torch.tensor, torch.tensor]: next parmaeter, value at the point
+        """
+        start = time.perf_counter()
+        y_var = None if self.y_var is None else self.y_var[-n_new:]
+        self.model = self._conditioned(self.model, self.x[-n_new:], self.y[-n_new:], y_var)
+        self.likelihood = self.model.likelihood #type: ignore
+        self._grid_posterior = None
+        self.fit_info = {"fitter": "incremental", "iterations": 0, "time": time.perf_counter() - start, "loss": math.nan}
+        return self._propose(batch_size, x_pending)
+
+    @staticmethod
+    def _conditioned(model: Any, x: torch.Tensor, y: torch.Tensor, y_var: Optional[torch.Tensor] = None) -> Any:
+        """Model conditioned on new observations, a fixed noise GP needs their noise variance
+        (the average noise of its observations for fantasized outcomes)"""
+        if isinstance(model, FixedNoiseGP):
+            noise = y_var if y_var is not None else model.likelihood.noise.mean().expand_as(y)
+            return model.condition_on_observations(x, y, noise=noise)
+        return model.condition_on_observations(x, y)
+
+    def _acquisition(self, model: Any = None, batch: bool = False) -> Any:
+        """Build the acquisition function on the given model
+
+        Args:
+            model (Any, optional): model to build the acquisition on. Defaults to self.model.
+            batch (bool, optional): the Monte-Carlo variant, for a batch or pending parameters. Defaults to False.
+
+        Returns:
+            Any: botorch acquisition function
+        """
+        model = model if model is not None else self.model
+        # observed parameters, without the task column of a multi fidelity model
+        baseline = self._train_inputs(model)[..., :self.n_parms]
+        acq = build_acquisition(self.acq_type, model, self._incumbent(model, baseline), baseline, batch=batch,
+                beta=self.ucb_beta, n_samples=self.N_POINTS)
+        if self.switching_cost > 0:
+            # the applied parameter is the last observed one (the pending one for a lookahead fantasy)
+            acq = penalize_travel(acq, baseline[-1:], self._span.to(baseline), self.switching_cost)
+        return acq
+
+    @staticmethod
+    def _gp(model: Any) -> Any:
+        """gpytorch model holding the training data, kernel and mean, wrapped by botorch for a variational GP"""
+        return model.model if isinstance(model, ApproximateGPyTorchModel) else model
+
+    @classmethod
+    def _train_inputs(cls, model: Any) -> torch.Tensor:
+        """Training inputs of the model"""
+        return cls._gp(model).train_inputs[0]
+
+    @property
+    def _span(self) -> torch.Tensor:
+        """Width of the range of every parameter"""
+        return torch.tensor(self.range[1] - self.range[0])
+
+    @staticmethod
+    def _incumbent(model: Any, baseline: torch.Tensor) -> float:
+        """Best posterior mean at the observed parameters, the improvement is measured from it as the
+        observations are noisy"""
+        model.eval()
+        with torch.no_grad():
+            return model.posterior(baseline).mean.max().item()
+
+    def _acq_budget(self) -> Tuple[int, int]:
+        """Number of restarts and raw samples for the acquisition optimization, scaled with n_parms unless fixed
+
+        Returns:
+            Tuple[int, int]: num_restarts, raw_samples
+        """
+        num_restarts = self.num_restarts or min(self.RESTARTS_PER_PARM * self.n_parms, self.MAX_RESTARTS)
+        raw_samples = self.raw_samples or min(self.RAW_SAMPLES_PER_PARM * self.n_parms, self.MAX_RAW_SAMPLES)
+        return num_restarts, max(raw_samples, num_restarts)
+
+    def _optimize_acquisition(self, acq: Any, q: int = 1) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Optimize the acquisition function within the budget, seeding the restarts with the best
+        candidates of the previous optimization.
+
+        Args:
+            acq (Any): acquisition function
+            q (int, optional): number of points to optimize jointly. Defaults to 1.
+
+        Returns:
+            Tuple[torch.Tensor, torch.Tensor]: next parameter, acquisition value at the point
+        """
+        start = time.perf_counter()
+        bounds = self._acq_bounds()
+        num_restarts, raw_samples = self._acq_budget()
+        volume = 1.0
+        if self.trust_region is not None:
+            volume = self.trust_region.volume(bounds, torch.tensor(self.range).to(bounds))
+            num_restarts, raw_samples = self.trust_region.budget(num_restarts, raw_samples, volume)
+
+        if isinstance(acq, TravelPenalizedAcquisition):
+            acq.calibrate(draw_sobol_samples(bounds, n=raw_samples, q=q).to(bounds))
+        initial_conditions = gen_batch_initial_conditions(acq, bounds, q=q, num_restarts=num_restarts, raw_samples=raw_samples)
+        if self._seed_candidates is not None and self._seed_candidates.shape[1:] == initial_conditions.shape[1:]:
+            seeds = torch.max(torch.min(self._seed_candidates, bounds[1]), bounds[0]).to(initial_conditions)
+            seeds = seeds[:num_restarts // 2]
+            initial_conditions = torch.cat((initial_conditions[:num_restarts - len(seeds)], seeds))
+
+        candidates, values  = optimize_acqf(
             acq_function = acq,
-            bounds=torch.tensor(self.range).to(self.device),
-            q = 1,
-            num_restarts=1000,
-            raw_samples=2000,
+            bounds=bounds,
+            q = q,
+            num_restarts=len(initial_conditions),
+            batch_initial_conditions=initial_conditions,
+            return_best_only=False,
+            timeout_sec=self.acq_time_budget,
             options={},
         )
-        return new_point, value
+        order = torch.argsort(values, descending=True)
+        self._seed_candidates = candidates[order[:self.N_SEEDS]].detach()
+
+        candidate, value = self._select(acq, candidates, values, initial_conditions)
+        self.acq_info = {"num_restarts": len(initial_conditions), "raw_samples": raw_samples,
+                         "time": time.perf_counter() - start, **self._acq_values(acq, candidate, value), "volume": volume}
+        self.logger.info(f"acquisition optimized with {len(initial_conditions)} restarts in {self.acq_info['time']:.3f} s")
+        return candidate, value
+
+    def _select(self, acq: Any, candidates: torch.Tensor, values: torch.Tensor, fallback: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Best optimized candidate that does not duplicate the applied parameter (with a switching cost) or a pending
+        one, the best of the fallback points when all of them do
+
+        Args:
+            acq (Any): acquisition function
+            candidates (torch.Tensor): optimized candidates, restarts x q x n_parms
+            values (torch.Tensor): acquisition value of every candidate
+            fallback (torch.Tensor): points to choose from when all candidates are duplicates, restarts x q x n_parms
+
+        Returns:
+            Tuple[torch.Tensor, torch.Tensor]: q x n_parms candidate, acquisition value
+        """
+        excluded = [acq.X_pending] if getattr(acq, "X_pending", None) is not None else []
+        if isinstance(acq, TravelPenalizedAcquisition):
+            # the penalty pulls the candidates to the applied parameter (the previous one in a batch)
+            excluded += [acq.applied, acq.penalty_func.current]
+        if not excluded:
+            best = torch.argmax(values)
+            return candidates[best], values[best]
+
+        excluded = torch.cat(excluded).reshape(-1, self.n_parms).to(candidates)
+        span = self._span.to(candidates)
+
+        def duplicate(points: torch.Tensor) -> torch.Tensor:
+            distance = torch.cdist(points.reshape(-1, self.n_parms) / span, excluded / span) / math.sqrt(self.n_parms)
+            return (distance < self.DUPLICATE_TOL).any(dim=-1).reshape(len(points), -1).any(dim=-1)
+
+        keep = ~duplicate(candidates)
+        if not keep.any():
+            self.logger.info("all candidates duplicate the applied or a pending parameter, choosing among the fallback points")
+            with torch.no_grad():
+                candidates, values = fallback, acq(fallback)
+            keep = ~duplicate(candidates)
+            if not keep.any():
+                keep = torch.ones_like(keep)
+        best = torch.argmax(torch.where(keep, values, torch.full_like(values, -math.inf)))
+        return candidates[best], values[best]
+
+    @staticmethod
+    def _acq_values(acq: Any, candidate: torch.Tensor, value: torch.Tensor) -> Dict[str, float]:
+        """Acquisition value of the chosen candidate without the switching cost, reported in the diagnostics,
+        and with it"""
+        raw = value.item()
+        if isinstance(acq, PenalizedAcquisitionFunction):
+            with torch.no_grad():
+                raw = acq.raw_acqf(candidate.unsqueeze(0)).item()
+        return {"value": raw, "penalized": value.item()}
+
+    def _acq_bounds(self) -> torch.Tensor:
+        """Bounds of the acquisition optimization, the trust region around the incumbent (best posterior mean at the
+        observed parameters) when enabled
+
+        Returns:
+            torch.Tensor: 2 x n_parms bounds
+        """
+        bounds = torch.tensor(self.range).to(self.device)
+        if self.trust_region is None:
+            return bounds
+        baseline = self._train_inputs(self.model)[..., :self.n_parms]
+        self.model.eval() #type: ignore
+        with torch.no_grad():
+            mean = self.model.posterior(baseline).mean.reshape(-1) #type: ignore
+        lengthscale = self._gp(self.model).covar_module.base_kernel.lengthscale.detach().reshape(-1) #type: ignore
+        if lengthscale.numel() == self.n_parms:
+            lengthscale = lengthscale / self._span.to(lengthscale)
+        return self.trust_region.bounds(baseline[torch.argmax(mean)], bounds.to(baseline), lengthscale)
+
+    def _optimize_batch(self, acq: Any, batch_size: int, x_pending: Optional[np.ndarray] = None) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Sequential greedy batch optimization, each candidate is optimized with the previous candidates
+        and the parameters not evaluated yet as pending points.
+
+        Args:
+            acq (Any): Monte-Carlo acquisition function
+            batch_size (int): number of parameters to propose
+            x_pending (np.ndarray, optional): parameters proposed but not evaluated yet. Defaults to None.
+
+        Returns:
+            Tuple[torch.Tensor, torch.Tensor]: batch_size x n_parms parameters, acquisition values
+        """
+        assert isinstance(getattr(acq, "raw_acqf", acq), MCAcquisitionFunction), "batch proposals need a Monte-Carlo acquisition function"
+        pending = self.x[:0] if x_pending is None else torch.tensor(x_pending).reshape(-1, self.n_parms).to(self.x)
+        penalized = isinstance(acq, PenalizedAcquisitionFunction)
+        # the batch starts from the last pending parameter or the applied one
+        start = pending[-1:] if len(pending) else self.x[-1:]
+        if penalized:
+            acq.applied = acq.penalty_func.current = start #type: ignore
+        candidates, values = [], []
+        for _ in range(batch_size):
+            acq.set_X_pending(pending if len(pending) else None)
+            candidate, value = self._optimize_acquisition(acq)
+            pending = torch.cat((pending, candidate))
+            candidates.append(candidate)
+            values.append(value)
+            if penalized:
+                # travel from the previous parameter of the batch
+                acq.penalty_func.current = candidate #type: ignore
+        candidates, values = torch.cat(candidates), torch.stack(values)
+        if self.travel_order:
+            order = minimal_travel(candidates, start, self._span.to(candidates))
+            self.logger.info(f"batch ordered {order} for the least travel")
+            candidates, values = candidates[order], values[order]
+        return candidates, values
+
+    def lookahead(self, x_pending: np.ndarray, n_outcomes: int = 3) -> None:
+        """Precompute the next parameter for a set of possible outcomes of the bout currently running at
+        x_pending, using fantasies of the GP. The next run with the outcome refines the closest answer.
+
+        Args:
+            x_pending (np.ndarray): parameter of the running bout
+            n_outcomes (int, optional): number of fantasized outcomes. Defaults to 3.
+        """
+        assert self.model is not None, "run the optimization before the lookahead"
+        assert self.fidelity is None, "the lookahead needs a single fidelity model"
+        assert self.backend == "exact", "the lookahead needs the exact GP"
+        if self._refit_due():
+            self._build_model(reload_hyper=False)
+            self.fit_info = self._training(self.model, self.likelihood, self.x, self.y)
+
+        x_pending = torch.tensor(x_pending).reshape(1, self.n_parms).to(self.x)
+        self.model.eval() #type: ignore
+        with torch.no_grad():
+            posterior = self.model.posterior(x_pending, observation_noise=True) #type: ignore
+            mean, std = posterior.mean.reshape(()), posterior.variance.sqrt().reshape(())
+        outcomes = mean + std * torch.linspace(-self.LOOKAHEAD_SPREAD, self.LOOKAHEAD_SPREAD, n_outcomes).to(mean)
+
+        candidates = []
+        for outcome in outcomes:
+            fantasy = self._conditioned(self.model, x_pending, outcome.reshape(1, 1))
+            candidate, _ = self._optimize_acquisition(self._acquisition(fantasy))
+            candidates.append(candidate)
+
+        spacing = outcomes[1] - outcomes[0] if n_outcomes > 1 else std
+        self._lookahead = {"x": x_pending, "outcomes": outcomes, "candidates": torch.stack(candidates), "tolerance": spacing / 2}
+        self.logger.info(f"lookahead for {x_pending.flatten().tolist()} at outcomes {outcomes.tolist()}")
+
+    def _lookahead_hit(self, x: torch.Tensor, y: torch.Tensor, y_var: Optional[torch.Tensor] = None) -> bool:
+        """The new data is the previous data plus the pending bout, with an outcome close to a precomputed one"""
+        if self._lookahead is None or len(x) != len(self.x) + 1:
+            return False
+        if not (self._extends(x, y, y_var) and torch.allclose(x[-1:], self._lookahead["x"])):
+            return False
+        distance = torch.abs(self._lookahead["outcomes"] - y[-1, 0]).min()
+        return bool(distance <= self._lookahead["tolerance"])
+
+    def _refine_lookahead(self) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Condition the model on the observed outcome with the hyperparameters held fixed and refine the
+        precomputed candidates, closest outcome first, with a short optimization.
+
+        Returns:
+            Tuple[torch.Tensor, torch.Tensor]: next parameter, acquisition value at the point
+        """
+        start = time.perf_counter()
+        lookahead, self._lookahead = self._lookahead, None
+        y_var = None if self.y_var is None else self.y_var[-1:]
+        self._record_predictive(self.x[-1:], self.y[-1:], y_var)
+        self.model = self._conditioned(self.model, self.x[-1:], self.y[-1:], y_var)
+        self.likelihood = self.model.likelihood #type: ignore
+        self._grid_posterior = None
+        self.fit_info = {"fitter": "lookahead", "iterations": 0, "time": 0.0, "loss": math.nan}
+
+        order = torch.argsort(torch.abs(lookahead["outcomes"] - self.y[-1, 0])) #type: ignore
+        acq = self._acquisition()
+        bounds = self._acq_bounds()
+        if isinstance(acq, TravelPenalizedAcquisition):
+            acq.calibrate(draw_sobol_samples(bounds, n=self._acq_budget()[1], q=1).to(bounds))
+        initial_conditions = lookahead["candidates"][order]
+        candidates, values = optimize_acqf(
+            acq_function = acq,
+            bounds=bounds,
+            q = 1,
+            num_restarts=len(order),
+            batch_initial_conditions=initial_conditions,
+            return_best_only=False,
+            timeout_sec=self.acq_time_budget,
+            options={"maxiter": self.LOOKAHEAD_REFINE_ITER},
+        )
+        candidate, value = self._select(acq, candidates, values, initial_conditions)
+        self.acq_info = {"num_restarts": len(order), "raw_samples": 0, "time": time.perf_counter() - start,
+                         **self._acq_values(acq, candidate, value)}
+        self.logger.info(f"lookahead refined in {self.acq_info['time']:.3f} s")
+        return candidate, value
 
     # Temp function will be replaced is some way
     def _plot(self) -> None:
+        if self.n_parms != 1:
+            self.logger.warning(f"plotting is only supported for one parameter, skipped for {self.n_parms}")
+            return
         plt.cla()
         x = self.x.detach().numpy()
         y = self.y.detach().numpy()
         plt.plot(x, y, 'r.', ms = 10)
-        x_torch = torch.tensor(x).to(self.device)
-        y_torch = torch.tensor(y).to(self.device)
-        self.model.eval()  #type: ignore
-        self.likelihood.eval()
-        with torch.no_grad():
-            x_length = np.linspace(self.range[0,0],self.range[1,0],100).reshape(-1, 1)
-            # print(x_length,self.range)
-            observed = self.likelihood(self.model(torch.tensor(x_length))) #type: ignore
-            observed_mean = observed.mean.cpu().numpy() #type: ignore
-            upper, lower = observed.confidence_region() #type: ignore
-            # x_length = x_length.cpu().numpy()
-            
-        plt.plot(x_length.flatten(), observed_mean)
-        plt.fill_between(x_length.flatten(), lower.cpu().numpy(), upper.cpu().numpy(), alpha=0.2)
+        mean, variance = self.grid_posterior()
+        x_length = self.grid.cpu().numpy().flatten()
+        std = variance.sqrt().cpu().numpy()
+        observed_mean = mean.cpu().numpy()
+
+        plt.plot(x_length, observed_mean)
+        plt.fill_between(x_length, observed_mean - 2 * std, observed_mean + 2 * std, alpha=0.2)
         plt.legend(['Observed Data', 'mean', 'Confidence'])
         plt.pause(0.01)
 
-    def _save_model(self) -> None:
-        """Save the model and data in the given path
+    def _save_model(self, proposed: np.ndarray) -> None:
+        """Append the data, hyperparameters, proposed parameters and timings of this step to the session store
+
+        Args:
+            proposed (np.ndarray): parameters proposed in this step
         """
-        save_iter_path = self.model_save_path + f'iter_{len(self.x)}'
-        os.makedirs(save_iter_path, exist_ok=True)
-        model_path = save_iter_path +'/model.pth'
-        torch.save(self.model.state_dict(), model_path) #type: ignore
-        data_save = save_iter_path + '/data.csv'
         x = self.x.detach().cpu().numpy()
         y = self.y.detach().cpu().numpy()
-        full_data = np.hstack((x,y))
-        np.savetxt(data_save, full_data)
-        self.logger.info(f"model saved successfully at {save_iter_path}")
+        y_var = None if self.y_var is None else self.y_var.detach().cpu().numpy()
+        fidelity = None if self.fidelity is None else self.fidelity.detach().cpu().numpy()
+        timings = {"fit": self.fit_info, "acquisition": self.acq_info, "step": self.step_time, "diagnostics": self.diagnostics}
+        if self.trust_region is not None:
+            timings["trust_region"] = self.trust_region.state()
+        self.store.append_step(x, y, self.model.state_dict(), proposed, timings, y_var, fidelity) #type: ignore
+        self.logger.info(f"model saved successfully at {self.store.path}")
 
-    def run(self, x: np.ndarray, y: np.ndarray, reload_hyper: bool  = False ) -> np.ndarray:
+    def restore(self, path: str) -> None:
+        """Continue a saved session, the data and hyperparameters of its last step are reloaded and the
+        next steps are appended to the same session file.
+
+        Args:
+            path (str): session file
+        """
+        self.store = SessionStore(path)
+        state = self.store.load()
+        if state is None:
+            return
+        self.x = torch.tensor(state["x"]).reshape(-1, self.n_parms).to(self.device)
+        self.y = torch.tensor(state["y"]).reshape(-1, 1).to(self.device)
+        self.y_var = None if state["y_var"] is None else self._noise_variances(state["y_var"])
+        self.fidelity = None if state["fidelity"] is None else torch.tensor(state["fidelity"]).reshape(-1, 1).to(self.x)
+        self.hyper_state = {k: v.to(self.device) for k, v in state["hyperparameters"].items()}
+        if self.trust_region is not None and state["timings"].get("trust_region") is not None:
+            self.trust_region.load(state["timings"]["trust_region"])
+        self._build_model()
+        self._load_hyper(self.hyper_state)
+        self.model.eval() #type: ignore
+        self.logger.info(f"restored iteration {state['iteration']} with {len(self.x)} points from {path}")
+
+    def fit_sessions(self, paths: List[str], exclude: Optional[str] = None) -> None:
+        """Fit the model on the data pooled from saved sessions, without proposing a parameter. The posterior is
+        then available through grid_posterior, predicted_best and model.posterior. With the svgp backend thousands
+        of observations fit in seconds.
+
+        Args:
+            paths (List[str]): session files, iter_* directories or directories containing them
+            exclude (str, optional): session file to skip (the current one). Defaults to None.
+        """
+        xs, ys = [], []
+        for path in session_paths(paths):
+            if exclude is not None and os.path.abspath(path) == os.path.abspath(exclude):
+                continue
+            session = load_session(path)
+            if session is None or np.size(session[0]) != len(session[1]) * self.n_parms:
+                continue
+            xs.append(np.reshape(session[0], (-1, self.n_parms)))
+            ys.append(np.reshape(session[1], (-1, 1)))
+        assert len(xs), f"no session with {self.n_parms} parameters in {paths}"
+
+        self.x = torch.tensor(np.concatenate(xs)).to(self.device)
+        self.y = torch.tensor(np.concatenate(ys)).to(self.device)
+        self.y_var = None
+        self.fidelity = None
+        self._lookahead = None
+        self._build_model()
+        gp = self._gp(self.model)
+        self.fit_info = self._training(self.model, self.likelihood, gp.train_inputs[0], gp.train_targets.unsqueeze(-1)) #type: ignore
+        self.logger.info(f"fitted {len(self.x)} points pooled from {len(xs)} sessions")
+
+    def _build_model(self, reload_hyper: bool = False) -> None:
+        """Build the GP on the current data
+
+        Args:
+            reload_hyper (bool, optional): Keep the likelihood and kernel of the previous iter. Defaults to False.
+        """
+        self._grid_posterior = None
+        if not reload_hyper:
+            self.kernel.reset()
+            self.likelihood = GaussianLikelihood(noise_constraint = Interval(self._noise_constraints[0], self._noise_constraints[1]))
+        # else keeping the likehood save and kernel parameters so no need to reset those
+
+        assert self.fidelity is None or self.backend == "exact", "the multi fidelity model needs the exact GP"
+        if self.fidelity is not None:
+            # one task per fidelity, the posterior is the one of the target cost
+            train_x, train_y, train_y_var = self._task_data()
+            if train_y_var is not None:
+                self.model = FixedNoiseMultiTaskGP(train_x, train_y, train_y_var, task_feature=-1,
+                        covar_module=self.kernel.get_covr_module(), output_tasks=[0])
+            else:
+                self.model = MultiTaskGP(train_x, train_y, task_feature=-1, covar_module=self.kernel.get_covr_module(), output_tasks=[0])
+            self.likelihood = self.model.likelihood
+        elif self.backend == "svgp":
+            # inducing points start at a greedy variance reduction subset of the data, noise variances are not supported
+            if self.y_var is not None:
+                self.logger.warning("the svgp backend learns one noise level, the noise variances are ignored")
+            self.model = SingleTaskVariationalGP(self.x, self.y, likelihood=self.likelihood,
+                    covar_module=self.kernel.get_covr_module(), inducing_points=min(self.N_INDUCING, len(self.x)))
+        elif self.y_var is not None:
+            # known noise of every observation, noisy bouts weigh less
+            self.model = FixedNoiseGP(self.x, self.y, self.y_var, covar_module = self.kernel.get_covr_module())
+            self.likelihood = self.model.likelihood
+        else:
+            self.model = SingleTaskGP(self.x, self.y, likelihood = self.likelihood, covar_module = self.kernel.get_covr_module())
+        # TODO check if this ok for multi dimension models
+        if not reload_hyper and self.warm_start and self.hyper_state is not None:
+            # start from the hyperparameters fitted in the previous iteration
+            self._load_hyper(self.hyper_state)
+        if self.prior is not None:
+            # the first fit starts at the prior medians, the later ones from the previous fit
+            self.prior.apply(self.model, initialize=self.hyper_state is None)
+        self.model.to(self.device)
+
+    def _task_data(self) -> Tuple[torch.Tensor, torch.Tensor, Optional[torch.Tensor]]:
+        """Training data of the multi fidelity GP, the parameters with the fidelity as task column. The proxy costs
+        are rescaled to the mean and spread of the target costs, so the model stays in the units of the target cost.
+
+        Returns:
+            Tuple[torch.Tensor, torch.Tensor, Optional[torch.Tensor]]: inputs, costs, noise variances
+        """
+        y = self.y.clone()
+        y_var = None if self.y_var is None else self.y_var.clone()
+        fidelity = self.fidelity[:, 0] #type: ignore
+        target = fidelity == 0
+        for task in torch.unique(fidelity[~target]):
+            rows = fidelity == task
+            scale = 1.0
+            if target.sum() > 1 and rows.sum() > 1 and y[rows].std() > 0 and y[target].std() > 0:
+                scale = (y[target].std() / y[rows].std()).item()
+            shift = y[target].mean() - scale * y[rows].mean() if target.any() else 0.0
+            y[rows] = scale * y[rows] + shift
+            if y_var is not None:
+                y_var[rows] = y_var[rows] * scale ** 2
+        return torch.cat((self.x, self.fidelity), dim=-1), y, y_var #type: ignore
+
+    def _load_hyper(self, state: Dict[str, torch.Tensor]) -> None:
+        """Load hyperparameters into the model, only those it has (a fixed noise GP has no learned noise)"""
+        own = self.model.state_dict() #type: ignore
+        self.model.load_state_dict({k: v for k, v in state.items() if k in own and own[k].shape == v.shape}, strict=False) #type: ignore
+
+    def _noise_variances(self, y_var: Any) -> torch.Tensor:
+        """Noise variance of every observation, unknown (NaN) variances are set to the largest known one
+        and all are kept above the lower noise bound"""
+        y_var = torch.tensor(np.asarray(y_var, dtype=float)).reshape(-1, 1).to(self.device)
+        known = y_var[~torch.isnan(y_var)]
+        fill = known.max().item() if len(known) else float(self._noise_constraints[1])
+        return torch.nan_to_num(y_var, nan=fill).clamp_min(float(self._noise_constraints[0]))
+
+    def _extends(self, x: torch.Tensor, y: torch.Tensor, y_var: Optional[torch.Tensor]) -> bool:
+        """The data is the current data plus new points at the end"""
+        n = len(self.x)
+        if len(x) <= n or not (torch.equal(x[:n], self.x) and torch.equal(y[:n], self.y)):
+            return False
+        if (y_var is None) != (self.y_var is None):
+            return False
+        return y_var is None or torch.equal(y_var[:n], self.y_var) #type: ignore
+
+    def run(self, x: np.ndarray, y: np.ndarray, reload_hyper: bool  = False, batch_size: int = 1, x_pending: Optional[np.ndarray] = None,
+            y_var: Optional[np.ndarray] = None, fidelity: Optional[np.ndarray] = None) -> np.ndarray:
         """Run the optimization with input data points
 
         Args:
             x (NxM np.ndarray): Input parameters N -> n_parms, M -> iter
             y (Mx1): Cost function array
             reload_hyper (bool, optional): Reload the hyper parameter trained in the previous iter. Defaults to True.
+            batch_size (int, optional): Number of parameters to propose with one fit (qNEI with pending points). Defaults to 1.
+            x_pending (np.ndarray, optional): Parameters proposed but not evaluated yet. Defaults to None.
+            y_var (Mx1, optional): Noise variance of every cost, fits a fixed noise GP instead of learning one
+                noise level. Defaults to None.
+            fidelity (Mx1, optional): Fidelity of every cost, 0 for the target cost and 1, 2.. for cheaper proxies, fits
+                a multi task GP of the fidelities whose posterior is the target cost. Defaults to None.
 
         Returns:
-            np.ndarray: parameter to sample next
+            np.ndarray: parameters to sample next, batch_size x n_parms
         """
 
         
         assert len(x) == len(y), "Length should be equal."
 
-        self.x = torch.tensor(x).to(self.device)
-        self.y = torch.tensor(y).to(self.device)
+        x_new = torch.tensor(x).to(self.device)
+        y_new = torch.tensor(y).to(self.device)
+        y_var_new = None if y_var is None else self._noise_variances(y_var)
+        fidelity_new = None if fidelity is None else torch.tensor(np.asarray(fidelity, dtype=float)).reshape(-1, 1).to(x_new)
+        n = len(self.y)
+        if self.trust_region is not None and n and len(y_new) > n and torch.equal(x_new[:n], self.x):
+            # success or failure of the parameters proposed by the previous steps
+            self.trust_region.update(y_new[n:], self.y.max().item())
+        # the multi fidelity and variational models are refitted at every step
+        single = fidelity_new is None and self.fidelity is None and self.backend == "exact"
+        if single and batch_size == 1 and x_pending is None and self._lookahead_hit(x_new, y_new, y_var_new):
+            self.x, self.y, self.y_var = x_new, y_new, y_var_new
+            return self._step(self._refine_lookahead)
+        self._lookahead = None
 
-        if not reload_hyper:
-            self.kernel.reset()
-            self.likelihood = GaussianLikelihood(noise_constraint = Interval(self._noise_constraints[0], self._noise_constraints[1]))
-            self.model = SingleTaskGP(self.x, self.y, likelihood = self.likelihood, covar_module = self.kernel.get_covr_module()) 
-            # TODO check if this ok for multi dimension models
-            self.model.to(self.device)
+        n_new = len(x_new) - len(self.x)
+        if single and not reload_hyper and self.model is not None and self._extends(x_new, y_new, y_var_new):
+            # same data plus new points, keep the hyperparameters unless a refit is due
+            self._record_predictive(x_new[-n_new:], y_new[-n_new:], None if y_var_new is None else y_var_new[-n_new:])
+            if not self._refit_due():
+                self.x, self.y, self.y_var = x_new, y_new, y_var_new
+                return self._step(partial(self._condition, batch_size, x_pending, n_new))
 
-        else:
-            # keeping the likehood save and kernel parameters so no need to reset those
-            self.model = SingleTaskGP(self.x, self.y, likelihood = self.likelihood, covar_module = self.kernel.get_covr_module())
-            self.model.to(self.device)
+        self.x = x_new
+        self.y = y_new
+        self.y_var = y_var_new
+        self.fidelity = fidelity_new
+        self._build_model(reload_hyper)
 
         # fi the model and get the next parameter.
-        new_parameter = self._step()
+        new_parameter = self._step(partial(self._fit, batch_size, x_pending))
         
         return new_parameter
         
@@ -1,10 +1,21 @@
 import numpy as np
 import time 
 import pylsl
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Optional, Tuple
 
 
+from HIL.optimization.acceptance import BoutAcceptance
 from HIL.optimization.BO import BayesianOptimization
+from HIL.optimization.bout_length import AdaptiveBout
+from HIL.optimization.epochs import EpochEngine
+from HIL.optimization.initial_design import InitialDesign
+from HIL.optimization.transfer import TransferPrior
+from HIL.optimization.fidelity import FidelitySchedule
 from HIL.optimization.extract_cost import ExtractCost
+from HIL.optimization.session_store import SessionStore
+from HIL.optimization.stopping import StoppingRule
 
 
 
@@ -14,50 +25,127 @@ class HIL:
         Run the optimization.
         Check if the optimization is done.
     """
-    def __init__(self, args: dict) -> None:
+    # one operator prompt at a time when several sessions share a terminal
+    _prompt_lock = threading.Lock()
+
+    def __init__(self, args: dict, scheduler: Optional[Any] = None) -> None:
         """ cost_name: name of the cost function.
+
+        Args:
+            args (dict): config with the Cost and Optimization sections, and optionally Session (name, priority)
+                and Acceptance (operator or automatic acceptance of the bouts, see BoutAcceptance)
+            scheduler (Any, optional): shared scheduler running the optimization of several sessions
+                (see HIL.optimization.session_manager), by default a worker thread of this session.
         """
         self.n = int(0) # number of optimization
-        self.x = np.array([]) # input parameter for the exoskeleton
-        # self.y = np.array([]) # cost function
         self.args = args
+        self.n_parms = self.args['Optimization']['n_parms']
+        self.x = np.empty((0, self.n_parms)) # input parameter for the exoskeleton, one row per bout
+        # self.y = np.array([]) # cost function
+
+        # session name and priority when several sessions run together
+        self.name = self.args.get('Session', {}).get('name', '')
+        self.priority = self.args.get('Session', {}).get('priority', 0)
 
         # start the
         self.start_time = 0
 
         self._outlet_cost()
 
-        self._reset_data_collection()
+        # operator prompts or data quality rules to accept the bouts
+        self.acceptance = BoutAcceptance(self.args.get('Acceptance', {}))
 
 
         # start optimization
         self._start_optimization(self.args['Optimization'])
 
+        # set when cost samples arrive or a background optimization is done
+        self._wakeup = threading.Event()
+
         # start cost function
         self._start_cost(self.args['Cost'])
 
+        # cost of a bout from the samples after its parameter change
+        self.epochs = EpochEngine(transition=self.args['Cost'].get('transition', 0.0),
+                statistic=self.args['Cost'].get('statistic', 'mean'), tail=self.args['Cost'].get('tail', 5))
+
+        # bouts end once the steady state estimate is confident, otherwise after the Cost time
+        adaptive = self.args['Cost'].get('adaptive', None)
+        self.adaptive = AdaptiveBout(**adaptive) if adaptive else None
+
+        # multi fidelity: short bouts of a cheap proxy cost screen the new parameters
+        bounds = np.array(list(self.args['Optimization']['range']), dtype=float).reshape(2, self.n_parms)
+        self.fidelities = FidelitySchedule(self.args['Optimization'].get('multi_fidelity', None) or {}, bounds)
+        self.proxy = self._start_proxy(self.args['Cost']) if self.fidelities.enabled else None
+        self.proxy_epochs = EpochEngine(transition=self.fidelities.transition,
+                statistic=self.epochs.statistic_name, tail=self.epochs.tail)
+        # fidelity of the running bout
+        self.fidelity = FidelitySchedule.TARGET
+
+        self._reset_data_collection()
+
         # self.warm_up
         self.warm_up = True
 
         # start optimization
         self.OPTIMIZATION = False
 
+        # end the session early once the optimization has converged
+        self.stopping = StoppingRule(self.args['Optimization'].get('stopping', None) or {})
+        self.STOPPED = False
+
         # The ones which are done. 
-        self.x_opt = np.array([])
+        self.x_opt = np.empty((0, self.n_parms))
         self.y_opt = np.array([])
+        # variance of every recorded cost
+        self.y_var_opt = np.array([])
+        # fidelity of every recorded cost
+        self.fidelity_opt = np.array([], dtype=int)
+
+        # background optimization, the loop keeps collecting cost while the next parameter is computed
+        self.scheduler = scheduler
+        # own worker thread only without a shared scheduler
+        self._executor: Optional[ThreadPoolExecutor] = ThreadPoolExecutor(max_workers=1) if scheduler is None else None
+        self._future: Optional[Future] = None
+        self._lookahead_future: Optional[Future] = None
+
+        # continue the last saved session instead of starting over
+        if self.args['Optimization'].get('resume', False):
+            self._resume()
     
     def _outlet_cost(self) -> None:
-        """Create an outlet function to send when the optimization has changed
+        """Create an outlet function to send when the optimization has changed, the markers are the parameters and the cost
         """
-        info = pylsl.StreamInfo(name="Change_parm", type="Marker", channel_count=2, source_id='12345')
+        info = pylsl.StreamInfo(name="Change_parm", type="Marker", channel_count=self.n_parms + 1, source_id=self.name or '12345')
         self.outlet = pylsl.StreamOutlet(info)
 
-    def _reset_data_collection(self)  -> None:
-        """Reset data collection and restart the clocks
+    def _reset_data_collection(self, start_time: Optional[float] = None)  -> None:
+        """Reset data collection and restart the clocks, the cost of the bout is read from the samples after start_time
+
+        Args:
+            start_time (float, optional): start of the bout window (LSL local clock), now if None
         """
         self.store_cost_data = []
-        self.cost_time = 0
-        self.start_time = 0
+        self.store_cost_time = []
+        self.start_time = self._clock() if start_time is None else start_time
+        self.cost_time = self.start_time
+        self.acceptance.reset()
+        if self.adaptive is not None:
+            self.adaptive.reset()
+
+    def _clock(self) -> float:
+        """Current time in the clock of the cost timestamps"""
+        return pylsl.local_clock()
+
+    def _push_marker(self, sample: list) -> float:
+        """Send a marker on Change_parm stamped with the local clock
+
+        Returns:
+            float: timestamp of the marker
+        """
+        time_stamp = self._clock()
+        self.outlet.push_sample(sample, time_stamp)
+        return time_stamp
 
     def _start_optimization(self, args: dict) -> None:
         """O Start the optimization function, this will start the BO module
@@ -67,9 +155,30 @@ class HIL:
         """
         print(args['range'][0], args['range'][1])
         print(np.array(list(args['range'])))
+        transfer = args.get('transfer', None)
+        prior = None
+        if transfer:
+            prior = TransferPrior.from_sessions(transfer['sessions'], n_parms=args['n_parms'], min_scale=transfer.get('min_scale', 0.5))
         self.BO = BayesianOptimization(n_parms=args['n_parms'], 
                 range=np.array(list(args['range'])), 
-                model_save_path=args['model_save_path'])
+                model_save_path=args['model_save_path'],
+                acq=args.get('acquisition', 'ei'),
+                ucb_beta=args.get('ucb_beta', 2.0),
+                switching_cost=args.get('switching_cost', 0.0),
+                travel_order=args.get('travel_order', False),
+                trust_region=args.get('trust_region', None),
+                backend=args.get('backend', 'exact'),
+                svgp=args.get('svgp', None),
+                fitter=args.get('fitter', 'adam'),
+                max_iter=args.get('fit_max_iter', 500),
+                tol=args.get('fit_tol', 1e-4),
+                warm_start=args.get('warm_start', True),
+                num_restarts=args.get('num_restarts', None),
+                raw_samples=args.get('raw_samples', None),
+                acq_time_budget=args.get('acq_time_budget', None),
+                refit_every=args.get('refit_every', 1),
+                mll_drift=args.get('mll_drift', 1.0),
+                prior=prior)
 
     def _start_cost(self, args: dict) -> None:
         """Start the cost extraction module
@@ -78,19 +187,35 @@ class HIL:
             args (dict): Cost args
         """
         self.cost_time = 0
-        self.cost = ExtractCost(cost_name=args['Name'], number_samples=args['n_samples'])
+        self.cost = ExtractCost(cost_name=args['Name'],
+                buffer_time=args.get('buffer_time', 360), buffer_size=args.get('buffer_size', 4096),
+                wakeup=self._wakeup)
+
+    def _start_proxy(self, args: dict) -> ExtractCost:
+        """Start the extraction of the proxy cost of the multi fidelity optimization
 
+        Args:
+            args (dict): Cost args
+        """
+        return ExtractCost(cost_name=self.fidelities.proxy, #type: ignore
+                buffer_time=args.get('buffer_time', 360), buffer_size=args.get('buffer_size', 4096),
+                wakeup=self._wakeup)
 
     def start(self):
-        if self.n == 0:
+        if self.n == 0 and len(self.x) == 0:
             print(f'############################################################')
             print(f'############## Starting the optimization ###################')
             print(f'############## Using cost function {self.cost.cost_name} ###')
             print(f'############################################################')
             self._generate_initial_parameters()
-            self.outlet.push_sample([0,0])
+            self._record_plan()
+            self._reset_data_collection(self._push_marker([0] * (self.n_parms + 1)))
+        elif self.n < len(self.x):
+            self._next_fidelity()
+            print(f"############## Resuming at step {self.n}, parameter {self.x[self.n]} ###")
+            self._reset_data_collection(self._push_marker([*self.x[self.n], np.nan]))
         # start the optimization loop.
-        while self.n < self.args['Optimization']['n_steps']:
+        while self.n < self.args['Optimization']['n_steps'] and not self.STOPPED:
 
 
             # Still in exploration
@@ -98,14 +223,13 @@ class HIL:
                 print(f"In the exploration step {self.n}, parameter {self.x[self.n]}, len_cost {len(self.store_cost_data)}")
                 
                 if self.n == 0 and self.warm_up:
-                    input(f"Please give 2 min of warmup and hit any key to continue \n")
+                    self._warm_up()
                     self.warm_up = False
 
                 self._get_cost()
-                if (self.cost_time - self.start_time) > self.args['Cost']['time'] and len(self.store_cost_data) > 5: # 30 for 120
-                    print(f" cost is {np.nanmean(self.store_cost_data[-5:])}")
-                    out = input("Press Y to record the data: N to remove it:")
-                    if out == 'N':
+                if self._bout_done(): # 30 for 120
+                    print(f" cost is {self._bout_cost()}")
+                    if not self._accept_bout():
                         self._reset_data_collection()
                         print("#########################")
                         print("########### recollecting #######")
@@ -115,24 +239,25 @@ class HIL:
                             self.x_opt = np.array([self.x[self.n]])
                         else:
                             self.x_opt = np.concatenate((self.x_opt, np.array([self.x[self.n]])))
-                        mean_cost = np.nanmean(self.store_cost_data[-5:])
+                        mean_cost = self._bout_cost()
                         
                         if len(self.y_opt) < 1:
                             self.y_opt =  np.array([mean_cost])
                         else:
                             self.y_opt = np.concatenate((self.y_opt, np.array([mean_cost])))
+                        self.y_var_opt = np.concatenate((self.y_var_opt, np.array([self._bout_variance()])))
+                        self.fidelity_opt = np.append(self.fidelity_opt, self.fidelity)
 
                         print(f"recording cost function {self.y_opt[-1]}, for the parameter {self.x_opt[-1]}")
-                        self.outlet.push_sample([self.x_opt[-1],self.y_opt[-1]])
-                        self._reset_data_collection()
+                        self._reset_data_collection(self._push_marker([*self.x_opt[-1], self.y_opt[-1]]))
                         self.n += 1
-                        input("Enter to Continue")
+                        self._record_bout()
+                        self._pause("Enter to Continue")
 
             # Exploration is done and starting the optimization
             elif self.n == self.args['Optimization']['n_exploration'] and not self.OPTIMIZATION:
-                print(f" cost is {np.nanmean(self.store_cost_data[-5:])}")
-                out = input("Press Y to record the data: N to remove it:")
-                if out == 'N':
+                print(f" cost is {self._bout_cost()}")
+                if not self._confirm("Press Y to record the data: N to remove it:"):
                     self._reset_data_collection()
                     print("################################")
                     print("########### recollecting #######")
@@ -140,63 +265,286 @@ class HIL:
                 else:
                     print(f"starting the optimization.")
                     print(f"recording cost function {self.y_opt}, for the parameter {self.x_opt}")
-                    new_parameter = self.BO.run(self.x_opt.reshape(self.n, -1), self.y_opt.reshape(self.n, -1))
-                    print(f"Next parameter is {new_parameter}")
-                    self.outlet.push_sample([self.x_opt[-1],self.y_opt[-1]])
-                    
-                    #TODO Need to save the parameters and data for each iteration,
-                    self.x = np.concatenate((self.x, new_parameter.reshape(1,)), axis = 0)
+                    self._push_marker([*self.x_opt[-1], self.y_opt[-1]])
+                    self._submit_optimization()
                     self.OPTIMIZATION = True
+                    self._record_plan()
             
             else:
+                self._poll_optimization()
+                if self.n >= len(self.x):
+                    if self._future is None:
+                        # resumed after the bout was recorded but before its parameter was saved.
+                        self._submit_optimization()
+                    # next parameter is still being computed, keep reading the cost stream.
+                    self._get_cost()
+                    print(f"In the optimization loop {self.n}, waiting for the next parameter")
+                    self._wait(1)
+                    continue
+
                 print(f"In the optimization loop {self.n}, parameter {self.x[self.n]}")
                 self._get_cost()
-                if (self.cost_time - self.start_time) > self.args['Cost']['time']:
-                    out = input("Press Y to record the data: N to remove it:")
-                    if out == 'N':
+                if self._bout_done():
+                    if not self._accept_bout():
                         self._reset_data_collection()
                         print("################################")
                         print("########### recollecting #######")
                         print("################################")
                     else:
                         self.x_opt = np.concatenate((self.x_opt, np.array([self.x[self.n]])))
-                        mean_cost = np.nanmean(self.store_cost_data[-5:])
+                        mean_cost = self._bout_cost()
                         self.y_opt = np.concatenate((self.y_opt, np.array([mean_cost])))
+                        self.y_var_opt = np.concatenate((self.y_var_opt, np.array([self._bout_variance()])))
+                        self.fidelity_opt = np.append(self.fidelity_opt, self.fidelity)
                         self.n += 1
+                        self._record_bout()
                         print(f"recording cost function {self.y_opt[-1]}, for the parameter {self.x_opt[-1]}")
-                        new_parameter = self.BO.run(self.x_opt.reshape(self.n, -1), self.y_opt.reshape(self.n, -1))
-                        print(f"Next parameter is {new_parameter}")
-                        #TODO Need to save the parameters and data for each iteration
-                        self.x = np.concatenate((self.x, new_parameter.reshape(1,)), axis = 0)
-                        self.outlet.push_sample([self.x_opt[-1],self.y_opt[-1]])
-                        self._reset_data_collection()
-                        input("Enter to contiue")
+                        marker_time = self._push_marker([*self.x_opt[-1], self.y_opt[-1]])
+                        if self.n < len(self.x):
+                            # next parameter of the batch is already queued.
+                            self._next_fidelity()
+                            print(f"Next parameter is {self.x[self.n]} (queued)")
+                            marker_time = self._push_marker([*self.x[self.n], np.nan])
+                        else:
+                            # the next parameter is computed while the subject transitions.
+                            self._submit_optimization()
+                        self._reset_data_collection(marker_time)
+                        self._pause("Enter to contiue")
                     
 
-            time.sleep(1)
+            self._wait(1)
+
+        # wait for the last optimization step to be saved
+        for future in [self._lookahead_future, self._future]:
+            if future is not None:
+                future.exception()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+        self.cost.close()
+        if self.proxy is not None:
+            self.proxy.close()
+
+    def _sleep(self, seconds: float) -> None:
+        """Wait without reacting to the cost stream (warm up)"""
+        time.sleep(seconds)
+
+    def _wait(self, timeout: float) -> None:
+        """Wait until new cost samples arrive or a background optimization is done, at most timeout seconds"""
+        self._wakeup.wait(timeout)
+        self._wakeup.clear()
+
+    def _prompt(self, message: str) -> str:
+        """Ask the operator, prefixed with the session name when several sessions share the terminal"""
+        with HIL._prompt_lock:
+            return input(f"[{self.name}] {message}" if self.name else message)
+
+    def _warm_up(self) -> None:
+        """Warm up of the subject before the first bout, the operator confirms the end or it lasts warmup_time"""
+        if self.acceptance.auto:
+            print(f"Warm up for {self.acceptance.warmup_time} s")
+            self._sleep(self.acceptance.warmup_time)
+        else:
+            self._prompt(f"Please give 2 min of warmup and hit any key to continue \n")
+        # the first bout starts after the warm up
+        self._reset_data_collection()
+
+    def _accept_bout(self) -> bool:
+        """Decide if the collected bout is recorded, by the operator or by the data quality rules.
+        A command on the control stream overrides both."""
+        override = self.acceptance.override()
+        if override is not None:
+            print(f"Bout {'accepted' if override else 'rejected'} by the operator")
+            return override
+        if not self.acceptance.auto:
+            return self._prompt("Press Y to record the data: N to remove it:") != 'N'
+        accepted, reason = self.acceptance.check(self.store_cost_data)
+        print(f"Bout {'accepted' if accepted else 'rejected'}: {reason}")
+        return accepted
+
+    def _confirm(self, message: str) -> bool:
+        """Ask the operator to confirm, always confirmed in the auto mode"""
+        if self.acceptance.auto:
+            return True
+        return self._prompt(message) != 'N'
+
+    def _pause(self, message: str) -> None:
+        """Wait for the operator before the next bout, no wait in the auto mode.
+        The operator starts the next bout, its window starts when the operator continues."""
+        if not self.acceptance.auto:
+            self._prompt(message)
+            self._reset_data_collection()
+
+    def _submit(self, method: str, *args, **kwargs) -> Future:
+        """Run a BayesianOptimization method in the background, on the shared scheduler if there is one
+
+        Args:
+            method (str): name of the BayesianOptimization method
+
+        Returns:
+            Future: result of the method
+        """
+        if self.scheduler is not None:
+            future = self.scheduler.submit(self, method, *args, **kwargs)
+        else:
+            future = self._executor.submit(getattr(self.BO, method), *args, **kwargs) #type: ignore
+        # wake the loop to apply the result
+        future.add_done_callback(lambda _: self._wakeup.set())
+        return future
+
+    def _submit_optimization(self) -> None:
+        """Submit the optimization with the recorded data to the background worker, with a batch_size > 1
+        the proposed parameters are queued as consecutive bouts"""
+        # with heteroscedastic the variance of every cost is passed to a fixed noise GP
+        y_var = self.y_var_opt.reshape(self.n, -1) if self.args['Optimization'].get('heteroscedastic', False) else None
+        # with multi fidelity a multi task GP of the target and proxy costs
+        fidelity = self.fidelity_opt.reshape(self.n, -1) if self.fidelities.enabled else None
+        self._future = self._submit("run", self.x_opt.reshape(self.n, -1), self.y_opt.reshape(self.n, -1),
+                batch_size=self.args['Optimization'].get('batch_size', 1), y_var=y_var, fidelity=fidelity)
+
+    def _poll_optimization(self) -> None:
+        """Check the background optimization, the new parameter is applied and sent as soon as it is ready"""
+        if self._future is None or not self._future.done():
+            return
+        new_parameter = self._future.result()
+        self._future = None
+        diagnostics = self.BO.diagnostics
+        print(f"Convergence diagnostics {diagnostics}")
+        if self.stopping.update(diagnostics, self.n):
+            self._stop(diagnostics)
+            return
+        print(f"Next parameter is {new_parameter}")
+        self.x = np.concatenate((self.x, new_parameter.reshape(-1, self.n_parms)), axis = 0)
+        self._record_plan()
+        self._next_fidelity()
+        self._reset_data_collection(self._push_marker([*self.x[self.n], np.nan]))
+
+        n_outcomes = self.args['Optimization'].get('lookahead', 0)
+        if n_outcomes and len(new_parameter) == 1 and not self.fidelities.enabled:
+            # precompute the next parameter for likely outcomes while this bout runs
+            self._lookahead_future = self._submit("lookahead", self.x[-1], n_outcomes)
+            self._lookahead_future.add_done_callback(self._lookahead_done)
+
+    def _stop(self, diagnostics: dict) -> None:
+        """End the session with the stopping rule, the predicted best parameter is the result"""
+        self.STOPPED = True
+        best_parameter, best_value = self.BO.predicted_best()
+        print(f"Stopping after {self.n} bouts, {self.stopping.reason(diagnostics)}")
+        print(f"Predicted best parameter is {best_parameter} with cost {-best_value}")
+        self.BO.store.append({"kind": "stop", "n": self.n, "diagnostics": diagnostics, "best": best_parameter})
+
+    def _next_fidelity(self) -> None:
+        """Choose the fidelity of the bout at the next parameter, the exploration bouts use the target cost"""
+        self.fidelity = FidelitySchedule.TARGET
+        if self.OPTIMIZATION:
+            self.fidelity = self.fidelities.choose(self.x[self.n], self.x_opt, self.fidelity_opt)
+        if self.fidelity == FidelitySchedule.PROXY:
+            print(f"Screening {self.x[self.n]} with the proxy cost {self.fidelities.proxy}")
+
+    @staticmethod
+    def _lookahead_done(future: Future) -> None:
+        """Report a failed lookahead, the next optimization then runs from scratch"""
+        if future.exception() is not None:
+            print(f"lookahead failed: {future.exception()}")
+
+    def _record_bout(self) -> None:
+        """Append the accepted bout to the session store"""
+        self.BO.store.append({"kind": "bout", "n": self.n, "x": self.x_opt[-1], "y": self.y_opt[-1], "y_var": self.y_var_opt[-1],
+                "fidelity": self.fidelity_opt[-1]})
+
+    def _record_plan(self) -> None:
+        """Append the planned parameters and the phase to the session store"""
+        self.BO.store.append({"kind": "plan", "plan": self.x, "optimization": self.OPTIMIZATION})
+
+    def _resume(self) -> None:
+        """Restore the accepted bouts, planned parameters, phase and GP hyperparameters from the last
+        session file in model_save_path, the bout running at the crash is collected again."""
+        path = SessionStore.latest_path(self.args['Optimization']['model_save_path'])
+        if path is None:
+            print("No saved session to resume, starting a new one")
+            return
+        self.BO.restore(path)
+        bouts = list(self.BO.store.records("bout"))
+        plan = self.BO.store.latest("plan")
+        if len(bouts):
+            self.x_opt = np.array([bout["x"] for bout in bouts]).reshape(-1, self.n_parms)
+            self.y_opt = np.array([bout["y"] for bout in bouts])
+            self.y_var_opt = np.array([bout.get("y_var", np.nan) for bout in bouts], dtype=float)
+            self.fidelity_opt = np.array([bout.get("fidelity", FidelitySchedule.TARGET) for bout in bouts], dtype=int)
+        self.n = len(bouts)
+        if plan is not None:
+            self.x = np.array(plan["plan"]).reshape(-1, self.n_parms)
+            self.OPTIMIZATION = plan["optimization"]
+        step = self.BO.store.latest("step")
+        if self.OPTIMIZATION and self.n == len(self.x) and step is not None and step["start"] + len(step["x"]) == self.n:
+            # the parameters proposed after the last bout were saved but not applied yet
+            self.x = np.concatenate((self.x, np.array(step["proposed"]).reshape(-1, self.n_parms)))
+        self.warm_up = self.n == 0
+        print(f"Resumed {path}: {self.n} bouts, parameters {self.x}")
 
     def _generate_initial_parameters(self) -> None:
+        """Space filling start parameters over the range, after the anchors and the best parameters of prior sessions"""
         opt_args = self.args['Optimization']
-        self.x = np.random.random(opt_args['n_start_points'])*(opt_args['range'][1] - opt_args['range'][0]) + opt_args['range'][0]
-        self.x[0]=35.0
-        self.x[1]=75.0
-        self.x[2]=10.0
+        design_args = opt_args.get('initial_design', None) or {}
+        bounds = np.array(list(opt_args['range']), dtype=float).reshape(2, self.n_parms)
+        design = InitialDesign(bounds, method=design_args.get('method', 'sobol'), seed=design_args.get('seed', None))
+        prior = None
+        if design_args.get('prior_sessions', None):
+            prior = InitialDesign.prior_points(design_args['prior_sessions'], design_args.get('n_prior', 1), self.n_parms,
+                    exclude=self.BO.store.path)
+            print(f"Reusing {prior.tolist()} from the prior sessions")
+        self.x = design.generate(opt_args['n_start_points'], design_args.get('anchors', None), prior)
         print(f'###### start functions are {self.x} ######') 
         
         
     def _get_cost(self) -> None:
-        """This function extracts cost from pylsl, need to be called all the time."""
-
-        data,time_stamp = self.cost.extract_data()
-        
-        if time_stamp is not None:
-            # changing maximization to minimization.
-            data = data[-1] * -1
-            self.cost_time = time_stamp
-            self.store_cost_data.append(data)
-            if len(self.store_cost_data) == 1:
-                self.start_time = time_stamp
-            print(f"got cost {self.store_cost_data[-1]}, parameter {self.x[self.n]}, time: {self.cost_time - self.start_time}")
+        """This function reads the cost of the running bout from the buffered pylsl stream."""
+
+        # samples since the parameter change, the transition is dropped from the bout
+        cost, epochs = self._bout_source()
+        data, time_stamps = cost.window(self.start_time)
+        # changing maximization to minimization.
+        epoch, epoch_time = epochs.epoch(data, time_stamps, self.start_time)
+        self.store_cost_data = list(epoch * -1)
+        self.store_cost_time = list(epoch_time)
+        if len(time_stamps) and time_stamps[-1] != self.cost_time:
+            self.cost_time = time_stamps[-1]
+            parameter = self.x[self.n] if self.n < len(self.x) else "pending"
+            print(f"got cost {-data[-1]} ({len(self.store_cost_data)} samples), parameter {parameter}, time: {self.cost_time - self.start_time}")
+
+    def _bout_done(self) -> bool:
+        """The bout has enough samples to be decided and lasted the Cost time after the transition,
+        or with an adaptive bout length until the steady state estimate is confident"""
+        if not self.acceptance.ready(self.store_cost_data):
+            return False
+        _, epochs = self._bout_source()
+        elapsed = self.cost_time - self.start_time - epochs.transition
+        if self.fidelity == FidelitySchedule.PROXY:
+            return elapsed > self.fidelities.time
+        if self.adaptive is None:
+            return elapsed > self.args['Cost']['time']
+        # the estimators work on the stream values, not on the negated cost
+        self.adaptive.update(-np.array(self.store_cost_data), np.array(self.store_cost_time))
+        if self.adaptive.std is not None:
+            print(f"steady state {self.adaptive.mean} +- {self.adaptive.std} after {elapsed:.1f} s")
+        return self.adaptive.done(elapsed)
+
+    def _bout_cost(self) -> float:
+        """Cost of the running bout, the steady state estimate with an adaptive bout length"""
+        if self.adaptive is not None and self.adaptive.mean is not None:
+            return -self.adaptive.mean
+        return self._bout_source()[1].statistic(self.store_cost_data)
+
+    def _bout_variance(self) -> float:
+        """Variance of the cost of the running bout, from the steady state estimate or the spread of the samples"""
+        if self.adaptive is not None and self.adaptive.std is not None:
+            return self.adaptive.std ** 2
+        return self._bout_source()[1].variance(self.store_cost_data)
+
+    def _bout_source(self) -> Tuple[Any, EpochEngine]:
+        """Cost stream and epochs of the running bout, the proxy ones for a proxy bout"""
+        if self.fidelity == FidelitySchedule.PROXY:
+            return self.proxy, self.proxy_epochs
+        return self.cost, self.epochs
             
 
 
@@ -0,0 +1,85 @@
+import numpy as np
+import pylsl
+
+# typing
+from typing import List, Optional, Tuple
+
+
+class BoutAcceptance:
+    """
+    Decide if a bout is recorded. In the operator mode the operator answers the prompts, in the auto mode
+    the bout is accepted by data quality rules (enough samples, no NaN, cost std within bounds).
+    In both modes the operator can override the decision by sending "accept" or "reject" on a control
+    marker stream, the last command sent during the bout is used.
+    """
+    def __init__(self, args: dict) -> None:
+        """
+        Args:
+            args (dict): Acceptance config, mode ('operator' or 'auto'), min_samples, window, min_std, max_std,
+                reject_nan, warmup_time (s) and control (name of the control marker stream, null for none)
+        """
+        self.auto = args.get('mode', 'operator') == 'auto'
+        self.min_samples = args.get('min_samples', 6)
+        self.window = args.get('window', 5)
+        self.min_std = args.get('min_std', None)
+        self.max_std = args.get('max_std', None)
+        self.reject_nan = args.get('reject_nan', True)
+        self.warmup_time = args.get('warmup_time', 120)
+
+        # the control stream can be started after the optimization, it is connected when it shows up
+        self.control = args.get('control', None)
+        self._resolver = pylsl.ContinuousResolver(prop='name', value=self.control) if self.control else None
+        self._inlet: Optional[pylsl.StreamInlet] = None
+
+    def ready(self, data: List[float]) -> bool:
+        """The bout has enough samples to be decided"""
+        return len(data) >= self.min_samples
+
+    def check(self, data: List[float]) -> Tuple[bool, str]:
+        """Data quality rules of the auto mode
+
+        Args:
+            data (List[float]): cost samples of the bout
+
+        Returns:
+            Tuple[bool, str]: accepted and the reason
+        """
+        data = np.asarray(data, dtype=float)
+        if len(data) < self.min_samples:
+            return False, f"{len(data)} samples, less than {self.min_samples}"
+        if self.reject_nan and np.isnan(data).any():
+            return False, f"{np.isnan(data).sum()} NaN samples"
+        std = np.nanstd(data[-self.window:])
+        if self.min_std is not None and std < self.min_std:
+            return False, f"cost std {std:.4g} below {self.min_std}"
+        if self.max_std is not None and std > self.max_std:
+            return False, f"cost std {std:.4g} above {self.max_std}"
+        return True, f"{len(data)} samples, cost std {std:.4g}"
+
+    def override(self) -> Optional[bool]:
+        """Last operator command on the control stream since the previous call, None without a command"""
+        command = None
+        for sample in self._pull():
+            if sample in ("accept", "reject"):
+                command = sample == "accept"
+        return command
+
+    def reset(self) -> None:
+        """Drop the commands sent for the previous bout"""
+        self._pull()
+
+    def _pull(self) -> List[str]:
+        """Commands waiting on the control stream"""
+        if self._resolver is None:
+            return []
+        if self._inlet is None:
+            streams = self._resolver.results()
+            if not len(streams):
+                return []
+            self._inlet = pylsl.StreamInlet(streams[0])
+        commands = []
+        while True:
+            sample, _ = self._inlet.pull_sample(timeout=0.0)
+            if sample is None:
+                return commands
+            commands.append(str(sample[0]).strip().lower())
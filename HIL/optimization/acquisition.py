@@ -0,0 +1,183 @@
+import itertools
+import torch
+from botorch.acquisition import AcquisitionFunction
+from botorch.acquisition.penalized import PenalizedAcquisitionFunction
+from botorch.acquisition.analytic import (ExpectedImprovement, LogExpectedImprovement, ProbabilityOfImprovement,
+                                          UpperConfidenceBound)
+from botorch.acquisition.monte_carlo import (qExpectedImprovement, qNoisyExpectedImprovement, qProbabilityOfImprovement,
+                                             qUpperConfidenceBound)
+from botorch.sampling import SobolQMCNormalSampler
+
+# typing
+from typing import Any, Callable, Dict, List
+
+
+def _ei(model: Any, best_f: float, baseline: torch.Tensor, beta: float, sampler: Any) -> AcquisitionFunction:
+    return ExpectedImprovement(model, best_f)
+
+
+def _logei(model: Any, best_f: float, baseline: torch.Tensor, beta: float, sampler: Any) -> AcquisitionFunction:
+    return LogExpectedImprovement(model, best_f)
+
+
+def _pi(model: Any, best_f: float, baseline: torch.Tensor, beta: float, sampler: Any) -> AcquisitionFunction:
+    return ProbabilityOfImprovement(model, best_f)
+
+
+def _ucb(model: Any, best_f: float, baseline: torch.Tensor, beta: float, sampler: Any) -> AcquisitionFunction:
+    return UpperConfidenceBound(model, beta)
+
+
+def _qei(model: Any, best_f: float, baseline: torch.Tensor, beta: float, sampler: Any) -> AcquisitionFunction:
+    return qExpectedImprovement(model, best_f, sampler=sampler)
+
+
+def _qnei(model: Any, best_f: float, baseline: torch.Tensor, beta: float, sampler: Any) -> AcquisitionFunction:
+    return qNoisyExpectedImprovement(model, baseline, sampler=sampler)
+
+
+def _qpi(model: Any, best_f: float, baseline: torch.Tensor, beta: float, sampler: Any) -> AcquisitionFunction:
+    return qProbabilityOfImprovement(model, best_f, sampler=sampler)
+
+
+def _qucb(model: Any, best_f: float, baseline: torch.Tensor, beta: float, sampler: Any) -> AcquisitionFunction:
+    return qUpperConfidenceBound(model, beta, sampler=sampler)
+
+
+# acquisition functions by config name, the analytic ones evaluate one parameter at a time (q=1)
+ACQUISITIONS: Dict[str, Callable[..., AcquisitionFunction]] = {
+    "ei": _ei,
+    "logei": _logei,
+    "pi": _pi,
+    "ucb": _ucb,
+    "qei": _qei,
+    "qnei": _qnei,
+    "qpi": _qpi,
+    "qucb": _qucb,
+}
+# Monte-Carlo counterpart of the analytic acquisitions, for batches and pending parameters
+Q_VARIANTS = {"ei": "qnei", "logei": "qnei", "pi": "qpi", "ucb": "qucb"}
+
+
+def build_acquisition(name: str, model: Any, best_f: float, baseline: torch.Tensor, batch: bool = False,
+                      beta: float = 2.0, n_samples: int = 256, seed: int = 1234) -> AcquisitionFunction:
+    """Acquisition function from the registry
+
+    Args:
+        name (str): config name, one of ACQUISITIONS
+        model (Any): GP model
+        best_f (float): incumbent value for the improvement based acquisitions
+        baseline (torch.Tensor): observed parameters, for the noisy expected improvement
+        batch (bool, optional): the Monte-Carlo variant, to propose several parameters or with pending ones. Defaults to False.
+        beta (float, optional): exploration weight of the upper confidence bound. Defaults to 2.0.
+        n_samples (int, optional): quasi Monte-Carlo (Sobol) samples of the q-variants. Defaults to 256.
+        seed (int, optional): seed of the Sobol samples. Defaults to 1234.
+
+    Returns:
+        AcquisitionFunction: botorch acquisition function
+    """
+    if name not in ACQUISITIONS:
+        raise ValueError(f"acquisition {name} is not one of {list(ACQUISITIONS)}")
+    if batch:
+        name = Q_VARIANTS.get(name, name)
+    sampler = SobolQMCNormalSampler(torch.Size([n_samples]), seed=seed)
+    return ACQUISITIONS[name](model, best_f, baseline, beta, sampler)
+
+
+class TravelPenalty(torch.nn.Module):
+    """
+    Distance from the applied parameter, relative to the range and divided by sqrt(n_parms) so it is at most 1.
+    Subtracted from the acquisition, large changes of the assistance lengthen the transient of the next bout.
+    """
+    def __init__(self, current: torch.Tensor, span: torch.Tensor) -> None:
+        """
+        Args:
+            current (torch.Tensor): applied parameter, 1 x n_parms
+            span (torch.Tensor): width of the range of every parameter
+        """
+        super().__init__()
+        self.current = current
+        self.span = span
+
+    def forward(self, X: torch.Tensor) -> torch.Tensor:
+        # the farthest point of every q-batch, smooth at the applied parameter
+        distance = ((X - self.current) / self.span).pow(2).sum(dim=-1).add(1e-12).sqrt().max(dim=-1).values
+        return distance / X.shape[-1] ** 0.5
+
+
+class TravelPenalizedAcquisition(PenalizedAcquisitionFunction):
+    """
+    Acquisition minus the travel from the applied parameter. The weight is relative to the spread (max - median) of
+    the raw acquisition over a reference sample, set by calibrate, so it does not depend on the acquisition type or the
+    scale of the cost (the median ignores the long lower tail of log EI). With a weight below 1 the best candidate of
+    the raw acquisition beats staying at a parameter with a below median acquisition value.
+    """
+    def __init__(self, acq: AcquisitionFunction, current: torch.Tensor, span: torch.Tensor, weight: float) -> None:
+        """
+        Args:
+            acq (AcquisitionFunction): acquisition function
+            current (torch.Tensor): applied parameter, 1 x n_parms
+            span (torch.Tensor): width of the range of every parameter
+            weight (float): penalty of the largest travel relative to the spread of the acquisition
+        """
+        super().__init__(acq, TravelPenalty(current, span), 0.0)
+        self.weight = weight
+        # the penalty of a batch moves to the previous parameter, the applied one stays here
+        self.applied = current
+
+    def calibrate(self, X: torch.Tensor) -> None:
+        """Scale the penalty with the spread of the raw acquisition
+
+        Args:
+            X (torch.Tensor): reference sample, samples x q x n_parms
+        """
+        with torch.no_grad():
+            values = self.raw_acqf(X)
+        self.regularization_parameter = self.weight * (values.max() - values.median()).clamp_min(0).item()
+
+
+def penalize_travel(acq: AcquisitionFunction, current: torch.Tensor, span: torch.Tensor, weight: float) -> TravelPenalizedAcquisition:
+    """Acquisition minus the travel from the applied parameter, calibrate before optimizing it
+
+    Args:
+        acq (AcquisitionFunction): acquisition function
+        current (torch.Tensor): applied parameter, 1 x n_parms
+        span (torch.Tensor): width of the range of every parameter
+        weight (float): penalty of the largest travel relative to the spread of the acquisition
+
+    Returns:
+        TravelPenalizedAcquisition: penalized acquisition, the raw one is acq.raw_acqf
+    """
+    return TravelPenalizedAcquisition(acq, current, span, weight)
+
+
+def minimal_travel(points: torch.Tensor, start: torch.Tensor, span: torch.Tensor, max_exact: int = 7) -> List[int]:
+    """Order of the points with the least travel from start through all of them, exact for up to max_exact points
+    and nearest neighbour beyond
+
+    Args:
+        points (torch.Tensor): points x n_parms
+        start (torch.Tensor): applied parameter
+        span (torch.Tensor): width of the range of every parameter
+        max_exact (int, optional): largest number of points ordered by trying all orders. Defaults to 7.
+
+    Returns:
+        List[int]: order of the points
+    """
+    # node 0 is the start, node i + 1 the point i
+    nodes = torch.cat((start.reshape(1, -1), points)) / span
+    distance = torch.cdist(nodes, nodes)
+    n = len(points)
+    if n <= max_exact:
+        def travel(order: tuple) -> float:
+            path = (0,) + tuple(i + 1 for i in order)
+            return sum(distance[a, b].item() for a, b in zip(path[:-1], path[1:]))
+        return list(min(itertools.permutations(range(n)), key=travel))
+    order: List[int] = []
+    last = 0
+    for _ in range(n):
+        remaining = [i for i in range(n) if i not in order]
+        nearest = min(remaining, key=lambda i: distance[last, i + 1].item())
+        order.append(nearest)
+        last = nearest + 1
+    return order
@@ -0,0 +1,89 @@
+import numpy as np
+
+# typing
+from typing import Optional
+
+
+class AdaptiveBout:
+    """
+    Adaptive bout length. The steady state cost of the running bout is estimated online, the bout ends once
+    the std of the estimate and its change since the previous estimate are below a threshold, not before
+    min_time and at most after max_time.
+    Estimators: "ppe" the phase plane estimation of the metabolic cost (HIL.cost_processing.metabolic_cost),
+    "mean" the mean of the samples with its standard error (e.g. RMSSD).
+    """
+    ESTIMATORS = ("ppe", "mean")
+
+    def __init__(self, estimator: str = "ppe", std_threshold: float = 0.1, min_time: float = 30.0,
+                 max_time: float = 120.0, interval: float = 5.0) -> None:
+        """
+        Args:
+            estimator (str, optional): steady state estimator, ppe or mean. Defaults to "ppe".
+            std_threshold (float, optional): std (and change) of the estimate to end the bout, in cost units. Defaults to 0.1.
+            min_time (float, optional): minimum bout duration (s) after the transition. Defaults to 30.0.
+            max_time (float, optional): maximum bout duration (s) after the transition. Defaults to 120.0.
+            interval (float, optional): seconds of data between two estimates, the ppe fit takes time. Defaults to 5.0.
+        """
+        if estimator not in self.ESTIMATORS:
+            raise ValueError(f"estimator {estimator} is not one of {self.ESTIMATORS}")
+        self.estimator = estimator
+        self.std_threshold = std_threshold
+        self.min_time = min_time
+        self.max_time = max_time
+        self.interval = interval
+        self.reset()
+
+    def reset(self) -> None:
+        """Forget the estimate of the previous bout"""
+        self.mean: Optional[float] = None
+        self.std: Optional[float] = None
+        self.change = np.inf
+        self._estimated_at = -np.inf
+
+    def update(self, values: np.ndarray, time_stamps: np.ndarray) -> None:
+        """Estimate the steady state when interval seconds of data arrived since the last estimate
+
+        Args:
+            values (np.ndarray): cost samples of the bout, after the transition
+            time_stamps (np.ndarray): timestamps of the samples
+        """
+        values = np.asarray(values, dtype=float)
+        time_stamps = np.asarray(time_stamps, dtype=float)
+        valid = ~np.isnan(values)
+        values, time_stamps = values[valid], time_stamps[valid]
+        if len(values) < 3 or time_stamps[-1] - self._estimated_at < self.interval:
+            return
+        self._estimated_at = time_stamps[-1]
+        previous = self.mean
+        if self.estimator == "ppe":
+            self.mean, self.std = self._ppe(values, time_stamps - time_stamps[0])
+        else:
+            self.mean = float(np.mean(values))
+            self.std = float(np.std(values, ddof=1) / np.sqrt(len(values)))
+        # the estimate still drifts during the transition
+        self.change = np.inf if previous is None or self.mean is None else abs(self.mean - previous)
+
+    def done(self, elapsed: float) -> bool:
+        """The bout can end
+
+        Args:
+            elapsed (float): seconds of the bout after the transition
+        """
+        if elapsed >= self.max_time:
+            return True
+        return (elapsed >= self.min_time and self.std is not None and self.std < self.std_threshold
+                and self.change < self.std_threshold)
+
+    @staticmethod
+    def _ppe(values: np.ndarray, time: np.ndarray) -> tuple:
+        """Steady state of the metabolic cost from the phase plane, None if there is not enough data yet"""
+        # optional dependencies of the metabolic cost processing
+        from HIL.cost_processing.metabolic_cost.ppe import PPE
+        if time[-1] < 2:
+            return None, None
+        try:
+            mean, std = PPE().estimate(values, time)
+        except ValueError:
+            # too few samples for the mixture model
+            return None, None
+        return float(np.ravel(mean)[0]), float(np.ravel(std)[0])
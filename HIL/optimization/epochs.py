@@ -0,0 +1,104 @@
+import numpy as np
+
+# typing
+from typing import Optional, Tuple
+
+
+class EpochEngine:
+    """
+    Cut the cost samples into parameter epochs by their timestamps. An epoch starts at the Change_parm marker
+    of its parameter (LSL local clock, the cost inlet is clock synced), the transition after the marker is
+    dropped and the cost of the epoch is a statistic of its last samples.
+    """
+    STATISTICS = ("mean", "median")
+
+    def __init__(self, transition: float = 0.0, statistic: str = "mean", tail: Optional[int] = 5) -> None:
+        """
+        Args:
+            transition (float, optional): seconds after the marker dropped from the epoch. Defaults to 0.0.
+            statistic (str, optional): cost of the epoch, mean or median of the samples. Defaults to "mean".
+            tail (int, optional): last samples of the epoch used for the statistic, None for all. Defaults to 5.
+        """
+        if statistic not in self.STATISTICS:
+            raise ValueError(f"statistic {statistic} is not one of {self.STATISTICS}")
+        self.transition = transition
+        self.statistic_name = statistic
+        self.tail = tail
+
+    def slices(self, time_stamps: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Index range of the samples of every epoch, after the transition
+
+        Args:
+            time_stamps (np.ndarray): timestamps of the samples, in time order
+            starts (np.ndarray): marker time of every epoch
+            ends (np.ndarray): end of every epoch (next marker)
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: first and last (excluded) sample of every epoch
+        """
+        first = np.searchsorted(time_stamps, np.asarray(starts) + self.transition, side="left")
+        last = np.maximum(np.searchsorted(time_stamps, ends, side="left"), first)
+        return first, last
+
+    def epoch(self, values: np.ndarray, time_stamps: np.ndarray, start: float, end: float = np.inf) -> Tuple[np.ndarray, np.ndarray]:
+        """Samples of one epoch after the transition
+
+        Args:
+            values (np.ndarray): cost samples
+            time_stamps (np.ndarray): timestamps of the samples, in time order
+            start (float): marker time of the epoch
+            end (float, optional): end of the epoch. Defaults to inf.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: costs and timestamps of the epoch
+        """
+        first, last = self.slices(time_stamps, np.array([start]), np.array([end]))
+        return np.asarray(values)[first[0]:last[0]], np.asarray(time_stamps)[first[0]:last[0]]
+
+    def statistic(self, samples: np.ndarray) -> float:
+        """Cost of an epoch from its samples, NaN samples are ignored"""
+        samples = np.asarray(samples, dtype=float)
+        if self.tail is not None:
+            samples = samples[-self.tail:]
+        if not len(samples) or np.isnan(samples).all():
+            return np.nan
+        return float(np.nanmedian(samples) if self.statistic_name == "median" else np.nanmean(samples))
+
+    def variance(self, samples: np.ndarray) -> float:
+        """Variance of the epoch cost (squared standard error of the mean of the samples used), NaN with
+        less than 2 samples"""
+        samples = np.asarray(samples, dtype=float)
+        if self.tail is not None:
+            samples = samples[-self.tail:]
+        samples = samples[~np.isnan(samples)]
+        if len(samples) < 2:
+            return np.nan
+        # the median is less efficient than the mean for normal samples
+        efficiency = np.pi / 2 if self.statistic_name == "median" else 1.0
+        return float(efficiency * np.var(samples, ddof=1) / len(samples))
+
+    def statistics(self, values: np.ndarray, time_stamps: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+        """Cost of several epochs, e.g. to recompute the bouts of a recording
+
+        Args:
+            values (np.ndarray): cost samples
+            time_stamps (np.ndarray): timestamps of the samples, in time order
+            starts (np.ndarray): marker time of every epoch
+            ends (np.ndarray): end of every epoch (next marker)
+
+        Returns:
+            np.ndarray: cost of every epoch, NaN for an epoch without samples
+        """
+        values = np.asarray(values, dtype=float)
+        first, last = self.slices(time_stamps, starts, ends)
+        if self.tail is not None:
+            first = np.maximum(first, last - self.tail)
+        if self.statistic_name == "median":
+            return np.array([self.statistic(values[i:j]) for i, j in zip(first, last)])
+        # means of all epochs from the cumulative sums, NaN samples ignored
+        valid = ~np.isnan(values)
+        total = np.concatenate(([0.0], np.cumsum(np.where(valid, values, 0.0))))
+        count = np.concatenate(([0], np.cumsum(valid)))
+        n = count[last] - count[first]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(n > 0, (total[last] - total[first]) / n, np.nan)
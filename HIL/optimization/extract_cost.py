@@ -1,33 +1,109 @@
+import threading
 import pylsl
 import numpy as np
-from typing import Any, Tuple
+from typing import Optional, Tuple
+
+
+class CostBuffer:
+    """
+    Bounded ring buffer of timestamped cost samples, the oldest samples are overwritten when it is full.
+    Written by the reader thread and queried by time window by the optimization loop.
+    """
+    def __init__(self, capacity: int = 4096) -> None:
+        """
+        Args:
+            capacity (int, optional): number of samples kept. Defaults to 4096.
+        """
+        self.capacity = capacity
+        self._values = np.full(capacity, np.nan)
+        self._time_stamps = np.full(capacity, np.nan)
+        self._count = 0 # samples written since the start
+        self._lock = threading.Lock()
+
+    def append(self, values: np.ndarray, time_stamps: np.ndarray) -> None:
+        """Add samples in time order
+
+        Args:
+            values (np.ndarray): cost of every sample
+            time_stamps (np.ndarray): timestamp of every sample
+        """
+        values = np.asarray(values, dtype=float)[-self.capacity:]
+        time_stamps = np.asarray(time_stamps, dtype=float)[-self.capacity:]
+        index = (self._count + np.arange(len(values))) % self.capacity
+        with self._lock:
+            self._values[index] = values
+            self._time_stamps[index] = time_stamps
+            self._count += len(values)
+
+    def window(self, start: float = -np.inf, end: float = np.inf) -> Tuple[np.ndarray, np.ndarray]:
+        """Samples with start <= timestamp < end
+
+        Args:
+            start (float, optional): first timestamp of the window. Defaults to -inf.
+            end (float, optional): end of the window. Defaults to inf.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: costs and timestamps in time order
+        """
+        with self._lock:
+            split = self._count % self.capacity
+            if self._count < self.capacity:
+                values, time_stamps = self._values[:split].copy(), self._time_stamps[:split].copy()
+            else:
+                values = np.concatenate((self._values[split:], self._values[:split]))
+                time_stamps = np.concatenate((self._time_stamps[split:], self._time_stamps[:split]))
+        first, last = np.searchsorted(time_stamps, [start, end], side="left")
+        return values[first:last], time_stamps[first:last]
+
+    def __len__(self) -> int:
+        return min(self._count, self.capacity)
+
 
 class ExtractCost:
     """
     Check for the streaming has cost, if so extract and updated the cost function.
+    A reader thread drains the inlet into a CostBuffer as the samples arrive, so no sample is lost while
+    the optimization loop is busy or waits for the operator, and sets the wakeup event of the loop on every arrival.
     """
 
-    def __init__(self, cost_name: str = 'Met_cost', number_samples: int = 2) -> None:
+    def __init__(self, cost_name: str = 'Met_cost', buffer_time: float = 360,
+                 buffer_size: int = 4096, wakeup: Optional[threading.Event] = None) -> None:
+        """
+        Args:
+            cost_name (str, optional): name of the cost stream. Defaults to 'Met_cost'.
+            buffer_time (float, optional): seconds of data buffered by the inlet. Defaults to 360.
+            buffer_size (int, optional): samples kept for the time window queries. Defaults to 4096.
+            wakeup (threading.Event, optional): set when new samples arrive. Defaults to None.
+        """
         self.stream = pylsl.resolve_streams()
         self.cost_name = cost_name
         # check the if the can cost is streaming
         COST_PRESENT = self._check_cost()
         if not COST_PRESENT:
             raise NameError
-        self._setup_stream(number_samples)
+        self._setup_stream(buffer_time)
 
         # self._setup_cost_stream(max_duration)
         self.data = np.array([])
 
-    def _setup_stream(self, number_data: int = 2) -> None | pylsl.StreamInlet:
+        self.buffer = CostBuffer(buffer_size)
+        self.wakeup = wakeup
+        self._stop = threading.Event()
+        self._reader = threading.Thread(target=self._read, name=f"{cost_name}_reader", daemon=True)
+        if self.inlet is not None:
+            self._reader.start()
+
+    def _setup_stream(self, buffer_time: float = 360) -> None | pylsl.StreamInlet:
         self.inlet = None
         for info in self.stream:
             print(info)
             if info.name() == self.cost_name:
-                self.inlet = pylsl.StreamInlet(info, max_buflen=number_data)
+                # timestamps in the local clock, comparable with the Change_parm markers
+                self.inlet = pylsl.StreamInlet(info, max_buflen=int(buffer_time),
+                        processing_flags=pylsl.proc_clocksync | pylsl.proc_dejitter)
         return self.inlet
-        
-        
+
+
 
     def _check_cost(self) -> bool:
         """
@@ -38,27 +114,40 @@ class ExtractCost:
             if info.name() == self.cost_name:
                 print(f"Found {info.name} in the stream")
                 return True
-            
+
             # if not specific cost function is found search for any cost function.
             elif "cost" in info.name():
                 print(f"NOT FOUND {self.cost_name} in the stream")
                 print(f"Found {info.name} in the stream change the cost name to that to continue")
             else:
                 print(f"NOT Cost stream found")
-        
+
         return False
 
-    def extract_data(self, t:int = 30) -> Tuple[Any, Any]:
+    def _read(self) -> None:
+        """Reader thread, waits for the next sample and drains the rest of the chunk that arrived with it"""
+        while not self._stop.is_set():
+            sample, time_stamp = self.inlet.pull_sample(timeout=0.5) #type: ignore
+            if sample is None:
+                continue
+            chunk, time_stamps = self.inlet.pull_chunk(timeout=0.0) #type: ignore
+            self.buffer.append([s[-1] for s in [sample] + chunk], [time_stamp] + time_stamps)
+            if self.wakeup is not None:
+                self.wakeup.set()
+
+    def window(self, start: float = -np.inf, end: float = np.inf) -> Tuple[np.ndarray, np.ndarray]:
         """
-        Extract data from inlet.
+        Cost samples received in a time window (LSL local clock).
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: costs (last channel) and timestamps
         """
-        # self.inlet.time_correction()
-        # y = np.empty((1024))
-        if self.inlet is not None:
-            y,time_stamp = self.inlet.pull_sample(timeout=0.01)
-            if y is not None:
-                print(len(y))
-            return y, time_stamp
-        else:
+        if self.inlet is None:
             print("Check the stream and restart this code......")
-            return None, None
\ No newline at end of file
+        return self.buffer.window(start, end)
+
+    def close(self) -> None:
+        """Stop the reader thread"""
+        self._stop.set()
+        if self._reader.is_alive():
+            self._reader.join()
@@ -0,0 +1,57 @@
+import numpy as np
+
+# typing
+from typing import Optional
+
+
+class FidelitySchedule:
+    """
+    Fidelity of every bout in the multi fidelity optimization. A new parameter is screened first with a short
+    bout of the cheap proxy cost (e.g. RMSSD of ECG_processed), the parameters the optimization proposes
+    again after their screening get a full bout of the target cost. At most max_proxy proxy bouts run in a row.
+    """
+    TARGET = 0
+    PROXY = 1
+
+    def __init__(self, args: dict, bounds: np.ndarray) -> None:
+        """
+        Args:
+            args (dict): multi_fidelity config, proxy (name of the proxy cost stream), time and transition (s)
+                of a proxy bout, max_proxy and radius (distance relative to the range under which a parameter
+                counts as screened), empty to disable
+            bounds (np.ndarray): 2 x n_parms lower and upper bounds of the parameters
+        """
+        self.proxy: Optional[str] = args.get('proxy', None)
+        self.time = args.get('time', 10.0)
+        self.transition = args.get('transition', 0.0)
+        self.max_proxy = args.get('max_proxy', 2)
+        self.radius = args.get('radius', 0.05)
+        self.bounds = np.asarray(bounds, dtype=float)
+
+    @property
+    def enabled(self) -> bool:
+        return self.proxy is not None
+
+    def choose(self, x: np.ndarray, x_opt: np.ndarray, fidelity_opt: np.ndarray) -> int:
+        """Fidelity of the bout at a parameter
+
+        Args:
+            x (np.ndarray): parameter of the bout
+            x_opt (np.ndarray): recorded parameters, bouts x n_parms
+            fidelity_opt (np.ndarray): fidelity of every recorded bout
+
+        Returns:
+            int: TARGET or PROXY
+        """
+        if not self.enabled:
+            return self.TARGET
+        fidelity_opt = np.asarray(fidelity_opt, dtype=int)
+        # proxy bouts since the last target bout
+        targets = np.flatnonzero(fidelity_opt == self.TARGET)
+        n_proxy = len(fidelity_opt) - (targets[-1] + 1 if len(targets) else 0)
+        if n_proxy >= self.max_proxy:
+            return self.TARGET
+        span = self.bounds[1] - self.bounds[0]
+        distance = np.linalg.norm((np.reshape(x_opt, (-1, len(span))) - np.ravel(x)) / span, axis=-1) / np.sqrt(len(span))
+        screened = bool(np.any(distance <= self.radius))
+        return self.TARGET if screened else self.PROXY
@@ -0,0 +1,117 @@
+import glob
+import os
+import numpy as np
+from scipy.stats import qmc
+
+# typing
+from typing import List, Optional
+
+from HIL.optimization.session_store import SessionStore
+
+
+class InitialDesign:
+    """
+    Space filling initial parameters over the range. Fixed anchor points and the best parameters of prior
+    sessions come first, the rest are Sobol or Latin hypercube points, chosen to be far from the fixed
+    points when there are any.
+    """
+    METHODS = ("sobol", "lhs", "random")
+    # candidates per point for the selection around the fixed points
+    N_CANDIDATES = 64
+
+    def __init__(self, bounds: np.ndarray, method: str = "sobol", seed: Optional[int] = None) -> None:
+        """
+        Args:
+            bounds (np.ndarray): 2 x n_parms lower and upper bounds
+            method (str, optional): sobol, lhs or random. Defaults to "sobol".
+            seed (int, optional): seed of the scrambling. Defaults to None.
+        """
+        if method not in self.METHODS:
+            raise ValueError(f"method {method} is not one of {self.METHODS}")
+        self.bounds = np.asarray(bounds, dtype=float)
+        self.n_parms = self.bounds.shape[1]
+        self.method = method
+        self.rng = np.random.default_rng(seed)
+
+    def generate(self, n_points: int, anchors: Optional[np.ndarray] = None, prior: Optional[np.ndarray] = None) -> np.ndarray:
+        """Initial parameters
+
+        Args:
+            n_points (int): number of parameters
+            anchors (np.ndarray, optional): parameters always evaluated first, k x n_parms. Defaults to None.
+            prior (np.ndarray, optional): parameters reused from prior sessions, k x n_parms. Defaults to None.
+
+        Returns:
+            np.ndarray: n_points x n_parms parameters
+        """
+        fixed = [np.asarray(p, dtype=float).reshape(-1, self.n_parms) for p in (anchors, prior) if p is not None]
+        fixed_points = np.clip(np.concatenate(fixed), self.bounds[0], self.bounds[1]) if len(fixed) else np.empty((0, self.n_parms))
+        fixed_points = fixed_points[:n_points]
+        n_free = n_points - len(fixed_points)
+        if n_free == 0:
+            return fixed_points
+        if not len(fixed_points):
+            return self._scale(self._sample(n_free))
+
+        # maximin selection among space filling candidates, in the unit cube
+        candidates = self._sample(self.N_CANDIDATES * n_free)
+        chosen = self._unit(fixed_points)
+        distance = np.min(np.linalg.norm(candidates[:, None] - chosen[None], axis=-1), axis=1)
+        selected = []
+        for _ in range(n_free):
+            best = int(np.argmax(distance))
+            selected.append(candidates[best])
+            distance = np.minimum(distance, np.linalg.norm(candidates - candidates[best], axis=-1))
+        return np.concatenate((fixed_points, self._scale(np.array(selected))))
+
+    def _sample(self, n: int) -> np.ndarray:
+        """n points in the unit cube"""
+        if self.method == "sobol":
+            # balanced Sobol sequence needs a power of 2
+            sampler = qmc.Sobol(self.n_parms, scramble=True, seed=self.rng)
+            return sampler.random_base2(int(np.ceil(np.log2(max(n, 1)))))[:n]
+        if self.method == "lhs":
+            return qmc.LatinHypercube(self.n_parms, seed=self.rng).random(n)
+        return self.rng.random((n, self.n_parms))
+
+    def _scale(self, unit: np.ndarray) -> np.ndarray:
+        return self.bounds[0] + unit * (self.bounds[1] - self.bounds[0])
+
+    def _unit(self, points: np.ndarray) -> np.ndarray:
+        return (points - self.bounds[0]) / (self.bounds[1] - self.bounds[0])
+
+    @staticmethod
+    def prior_points(paths: List[str], n_best: int, n_parms: int, exclude: Optional[str] = None) -> np.ndarray:
+        """Best parameters (lowest cost) of the bouts recorded in prior sessions
+
+        Args:
+            paths (List[str]): session files or directories with session files
+            n_best (int): number of parameters
+            n_parms (int): number of parameters of the optimization
+            exclude (str, optional): session file to skip (the current one). Defaults to None.
+
+        Returns:
+            np.ndarray: n_best x n_parms parameters or less
+        """
+        files: List[str] = []
+        for path in paths:
+            files += sorted(glob.glob(os.path.join(path, "session_*.jsonl"))) if os.path.isdir(path) else [path]
+        x, y = [], []
+        for path in files:
+            if exclude is not None and os.path.abspath(path) == os.path.abspath(exclude):
+                continue
+            for bout in SessionStore(path).records("bout"):
+                if len(np.ravel(bout["x"])) == n_parms:
+                    x.append(np.ravel(bout["x"]))
+                    y.append(bout["y"])
+        # rejected or empty bouts have no cost (NaN), they are not anchors
+        y = np.array([np.nan if value is None else value for value in y], dtype=float)
+        finite = np.isfinite(y)
+        x, y = np.array(x).reshape(-1, n_parms)[finite], y[finite]
+        if not len(x):
+            return np.empty((0, n_parms))
+        # HIL stores the negated cost, the best bouts have the largest y
+        best = x[np.argsort(y)[::-1]]
+        # a parameter evaluated several times is used once
+        _, first = np.unique(best, axis=0, return_index=True)
+        return best[np.sort(first)][:n_best]
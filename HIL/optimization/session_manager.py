@@ -0,0 +1,147 @@
+import heapq
+import itertools
+import multiprocessing
+import pickle
+import threading
+import torch
+from concurrent.futures import Future, ProcessPoolExecutor
+
+# typing
+from typing import Any, Dict, List, Tuple
+
+from HIL.optimization.BO import BayesianOptimization
+from HIL.optimization.HIL import HIL
+
+
+def _init_worker(n_threads: int) -> None:
+    """Limit the torch threads of a worker so the workers do not oversubscribe the CPU"""
+    torch.set_num_threads(n_threads)
+
+
+def _call(state: bytes, method: str, args: tuple, kwargs: dict) -> Tuple[bytes, Any]:
+    """Run a BayesianOptimization method in a worker, the updated object is sent back with the result.
+    The object is pickled here rather than by the pool, whose torch reducer refuses the GP caches that
+    still hold autograd history."""
+    BO: BayesianOptimization = pickle.loads(state)
+    result = getattr(BO, method)(*args, **kwargs)
+    return pickle.dumps(BO), result
+
+
+class OptimizationScheduler:
+    """
+    Shared process pool for the GP fitting and acquisition optimization of several HIL sessions.
+    Tasks wait in a priority queue and are dispatched when a worker is free, highest session priority
+    first (then first come first served). A session has at most one task running, and the task is
+    dispatched with the latest BayesianOptimization of the session, which is replaced by the one
+    returned from the worker.
+    """
+    def __init__(self, n_workers: int = 2, threads_per_worker: int = 1) -> None:
+        """
+        Args:
+            n_workers (int, optional): number of worker processes. Defaults to 2.
+            threads_per_worker (int, optional): torch threads of each worker. Defaults to 1.
+        """
+        self.n_workers = n_workers
+        self._pool = ProcessPoolExecutor(max_workers=n_workers, mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker, initargs=(threads_per_worker,))
+        self._queue: List[Tuple[int, int, HIL, str, tuple, dict, Future]] = []
+        self._order = itertools.count()
+        self._lock = threading.Lock()
+        self._running = 0
+        self._busy: set = set()
+
+    def submit(self, session: HIL, method: str, *args, **kwargs) -> Future:
+        """Queue a BayesianOptimization method of the session
+
+        Args:
+            session (HIL): session submitting the task, its priority orders the queue
+            method (str): name of the BayesianOptimization method
+
+        Returns:
+            Future: result of the method
+        """
+        future: Future = Future()
+        with self._lock:
+            heapq.heappush(self._queue, (-session.priority, next(self._order), session, method, args, kwargs, future))
+        self._dispatch()
+        return future
+
+    def _dispatch(self) -> None:
+        """Send the highest priority tasks of idle sessions to the free workers. The tasks are taken from the queue
+        under the lock and submitted after it is released, a task finished before its callback is registered runs
+        _done in this thread, which takes the lock again."""
+        dispatched = []
+        with self._lock:
+            waiting = []
+            while self._running < self.n_workers and len(self._queue):
+                task = heapq.heappop(self._queue)
+                _, _, session, method, args, kwargs, future = task
+                if id(session) in self._busy:
+                    waiting.append(task)
+                    continue
+                self._running += 1
+                self._busy.add(id(session))
+                dispatched.append((session, method, args, kwargs, future))
+            for task in waiting:
+                heapq.heappush(self._queue, task)
+
+        failed = False
+        for session, method, args, kwargs, future in dispatched:
+            try:
+                pool_future = self._pool.submit(_call, pickle.dumps(session.BO), method, args, kwargs)
+            except Exception as error:
+                # e.g. BrokenProcessPool, free the worker and the session so its next tasks are dispatched
+                with self._lock:
+                    self._running -= 1
+                    self._busy.discard(id(session))
+                future.set_exception(error)
+                failed = True
+                continue
+            pool_future.add_done_callback(lambda done, session=session, future=future: self._done(done, session, future))
+        if failed:
+            self._dispatch()
+
+    def _done(self, done: Future, session: HIL, future: Future) -> None:
+        """Hand the updated BayesianOptimization back to its session and dispatch the next tasks"""
+        with self._lock:
+            self._running -= 1
+            self._busy.discard(id(session))
+        if done.exception() is not None:
+            future.set_exception(done.exception()) #type: ignore
+        else:
+            state, result = done.result()
+            session.BO = pickle.loads(state)
+            future.set_result(result)
+        self._dispatch()
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=True)
+
+
+class SessionManager:
+    """
+    Host several independent HIL sessions in one process, each with its own config (cost stream name,
+    model_save_path, Session name and priority). The sessions run their loops in threads and share one
+    OptimizationScheduler for the optimization.
+    """
+    def __init__(self, configs: List[Dict], n_workers: int = 2, threads_per_worker: int = 1) -> None:
+        """
+        Args:
+            configs (List[Dict]): config of every session, as for HIL
+            n_workers (int, optional): worker processes shared by the sessions. Defaults to 2.
+            threads_per_worker (int, optional): torch threads of each worker. Defaults to 1.
+        """
+        self.scheduler = OptimizationScheduler(n_workers, threads_per_worker)
+        self.sessions = []
+        for i, config in enumerate(configs):
+            config.setdefault('Session', {}).setdefault('name', f"session_{i}")
+            self.sessions.append(HIL(config, scheduler=self.scheduler))
+
+    def start(self) -> None:
+        """Run all the sessions until they are done"""
+        threads = [threading.Thread(target=session.start, name=session.name) for session in self.sessions]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.scheduler.shutdown()
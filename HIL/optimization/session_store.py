@@ -0,0 +1,279 @@
+import glob
+import itertools
+import json
+import os
+import time
+import numpy as np
+import torch
+
+# typing
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+
+def _to_json(value: Any) -> Any:
+    """Convert numpy and torch values to json types"""
+    if isinstance(value, (torch.Tensor, np.ndarray)):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"{type(value)} is not json serializable")
+
+
+# sessions created by this process, with the pid it makes the session file names unique
+_SESSION_COUNT = itertools.count()
+
+
+class SessionStore:
+    """
+    Append-only store of a HIL session.
+    Every record is one json line, flushed and fsync'd when it is appended, so a crash loses at most the
+    record being written. Optimization steps ("step" records) only hold the observations added since the
+    previous step, the state of any iteration is rebuilt by replaying the steps up to it.
+    """
+    def __init__(self, path: str) -> None:
+        """
+        Args:
+            path (str): path of the session file (.jsonl), created with its directory if needed.
+        """
+        self.path = path
+        directory = os.path.dirname(path)
+        if len(directory):
+            os.makedirs(directory, exist_ok=True)
+        # observations of the step records (x, y, y_var, fidelity), replayed from the file on the first step
+        self._stored: Optional[Tuple[np.ndarray, ...]] = None
+
+    @staticmethod
+    def new_path(directory: str) -> str:
+        """Path of a new session file, named by the start time with the pid and a counter of the process, so
+        sessions started in the same second (several sessions of a SessionManager) get different files
+
+        Args:
+            directory (str): directory of the session files
+
+        Returns:
+            str: path of the session file
+        """
+        while True:
+            name = time.strftime("session_%Y%m%d_%H%M%S") + f"_{os.getpid()}_{next(_SESSION_COUNT)}.jsonl"
+            path = os.path.join(directory, name)
+            if not os.path.exists(path):
+                return path
+
+    @staticmethod
+    def latest_path(directory: str) -> Optional[str]:
+        """Most recent session file in the directory
+
+        Args:
+            directory (str): directory with the session files
+
+        Returns:
+            Optional[str]: path of the session file, None if there is none
+        """
+        paths = sorted(glob.glob(os.path.join(directory, "session_*.jsonl")))
+        return paths[-1] if len(paths) else None
+
+    def append(self, record: Dict[str, Any]) -> None:
+        """Append one record to the store and sync it to the disk
+
+        Args:
+            record (Dict[str, Any]): json serializable record, numpy arrays and tensors are converted to lists
+        """
+        line = json.dumps(record, default=_to_json)
+        if self._torn_tail():
+            # the last write was interrupted, start the record on a new line
+            line = "\n" + line
+        with open(self.path, "a") as f:
+            f.write(line + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def append_step(self, x: np.ndarray, y: np.ndarray, hyperparameters: Dict[str, torch.Tensor], proposed: np.ndarray,
+                    timings: Dict[str, Any], y_var: Optional[np.ndarray] = None, fidelity: Optional[np.ndarray] = None) -> None:
+        """Append an optimization step with the observations added since the previous step
+
+        Args:
+            x (np.ndarray): all observed parameters
+            y (np.ndarray): all observed costs
+            hyperparameters (Dict[str, torch.Tensor]): model state dict
+            proposed (np.ndarray): parameters proposed in this step
+            timings (Dict[str, Any]): fit and acquisition reports
+            y_var (np.ndarray, optional): noise variance of all observed costs. Defaults to None.
+            fidelity (np.ndarray, optional): fidelity of all observed costs. Defaults to None.
+        """
+        last = self.latest("step")
+        # number of observations already written by the previous steps
+        n_stored = 0 if last is None else last["start"] + len(last["x"])
+        # only the new observations when the stored ones are unchanged, all of them when the data was replaced
+        start = n_stored if n_stored <= len(x) and self._extends(x, y, y_var, fidelity) else 0
+        self.append({
+            "kind": "step",
+            "iteration": 0 if last is None else last["iteration"] + 1,
+            "start": start,
+            "x": x[start:],
+            "y": y[start:],
+            "y_var": None if y_var is None else y_var[start:],
+            "fidelity": None if fidelity is None else fidelity[start:],
+            "hyperparameters": hyperparameters,
+            "proposed": proposed,
+            "timings": timings,
+        })
+        self._stored = tuple(None if value is None else np.array(value, dtype=float) for value in (x, y, y_var, fidelity))
+
+    def _extends(self, x: np.ndarray, y: np.ndarray, y_var: Optional[np.ndarray], fidelity: Optional[np.ndarray]) -> bool:
+        """The stored observations are the first observations of the new ones"""
+        if self._stored is None:
+            state = self.load()
+            if state is None:
+                return True
+            self._stored = (state["x"], state["y"], state["y_var"], state["fidelity"])
+        for stored, new in zip(self._stored, (x, y, y_var, fidelity)):
+            if stored is None or new is None:
+                if stored is not None or new is not None:
+                    return False
+                continue
+            stored = np.asarray(stored, dtype=float)
+            prefix = np.asarray(new, dtype=float)[:len(stored)]
+            if prefix.size != stored.size or not np.array_equal(prefix.ravel(), stored.ravel(), equal_nan=True):
+                return False
+        return True
+
+    def _torn_tail(self) -> bool:
+        """The file does not end with a complete line"""
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            return False
+        with open(self.path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) != b"\n"
+
+    def records(self, kind: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """Read the records in order, an incomplete last line (crash while writing) is skipped
+
+        Args:
+            kind (str, optional): only the records of this kind. Defaults to None.
+        """
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if kind is None or record.get("kind") == kind:
+                    yield record
+
+    def latest(self, kind: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Last record, read from the end of the file
+
+        Args:
+            kind (str, optional): last record of this kind. Defaults to None.
+
+        Returns:
+            Optional[Dict[str, Any]]: record, None if there is none
+        """
+        for line in self._reversed_lines():
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if kind is None or record.get("kind") == kind:
+                return record
+        return None
+
+    def load(self, iteration: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """State of the optimization after a step
+
+        Args:
+            iteration (int, optional): step to load, None for the latest. Defaults to None.
+
+        Returns:
+            Optional[Dict[str, Any]]: iteration, x, y, y_var and fidelity (None if not known for all observations),
+                hyperparameters (tensors), proposed and timings, None if not found
+        """
+        x: List = []
+        y: List = []
+        y_var: Optional[List] = []
+        fidelity: Optional[List] = []
+        state = None
+        for record in self.records("step"):
+            x = x[:record["start"]] + record["x"]
+            y = y[:record["start"]] + record["y"]
+            known = record.get("y_var") is not None and (y_var is not None or record["start"] == 0)
+            y_var = (y_var or [])[:record["start"]] + record["y_var"] if known else None
+            known = record.get("fidelity") is not None and (fidelity is not None or record["start"] == 0)
+            fidelity = (fidelity or [])[:record["start"]] + record["fidelity"] if known else None
+            state = record
+            if iteration is not None and record["iteration"] == iteration:
+                break
+        if state is None or (iteration is not None and state["iteration"] != iteration):
+            return None
+        return {
+            "iteration": state["iteration"],
+            "x": np.array(x),
+            "y": np.array(y),
+            "y_var": None if y_var is None else np.array(y_var),
+            "fidelity": None if fidelity is None else np.array(fidelity),
+            "hyperparameters": {k: torch.as_tensor(np.asarray(v)) for k, v in state["hyperparameters"].items()},
+            "proposed": np.array(state["proposed"]),
+            "timings": state["timings"],
+        }
+
+    def _reversed_lines(self, block_size: int = 4096) -> Iterator[str]:
+        """Lines of the file from the last to the first, reading blocks from the end"""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            position = f.tell()
+            remainder = b""
+            while position > 0:
+                read = min(block_size, position)
+                position -= read
+                f.seek(position)
+                lines = (f.read(read) + remainder).split(b"\n")
+                remainder = lines[0]
+                for line in reversed(lines[1:]):
+                    if len(line):
+                        yield line.decode()
+            if len(remainder):
+                yield remainder.decode()
+
+
+def session_paths(paths: List[str]) -> List[str]:
+    """Session files and legacy iter_* directories (model.pth, data.csv) under the paths
+
+    Args:
+        paths (List[str]): session files, iter_* directories or directories containing them
+
+    Returns:
+        List[str]: session files and iter_* directories
+    """
+    found: List[str] = []
+    for path in paths:
+        if os.path.isfile(path) or os.path.isfile(os.path.join(path, "model.pth")):
+            found.append(path)
+        elif os.path.isdir(path):
+            found += sorted(glob.glob(os.path.join(path, "session_*.jsonl")))
+            found += sorted(p for p in glob.glob(os.path.join(path, "iter_*")) if os.path.isfile(os.path.join(p, "model.pth")))
+    return found
+
+
+def load_session(path: str) -> Optional[Tuple[np.ndarray, np.ndarray, Dict[str, torch.Tensor]]]:
+    """Data and hyperparameters of the last step of a session file or a legacy iter_* directory
+
+    Args:
+        path (str): session file or iter_* directory
+
+    Returns:
+        Optional[Tuple[np.ndarray, np.ndarray, Dict[str, torch.Tensor]]]: x, y and hyperparameters, None if the
+            session has no step
+    """
+    if os.path.isdir(path):
+        # legacy format, one directory per iteration
+        data = np.loadtxt(os.path.join(path, "data.csv"), ndmin=2)
+        state = torch.load(os.path.join(path, "model.pth"), map_location="cpu")
+        return data[:, :-1], data[:, -1], state
+    state = SessionStore(path).load()
+    if state is None:
+        return None
+    return state["x"], np.ravel(state["y"]), state["hyperparameters"]
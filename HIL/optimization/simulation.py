@@ -0,0 +1,307 @@
+"""Offline simulation of HIL sessions.
+
+The real HIL loop and BayesianOptimization are driven against a synthetic or recorded cost landscape,
+with a simulated clock, noisy cost samples and automatic answers to the operator prompts. Many seeded
+sessions run on a process pool and the convergence and the wall clock per optimization step are reported.
+"""
+import contextlib
+import copy
+import io
+import math
+import multiprocessing
+import os
+import tempfile
+import time
+import numpy as np
+import torch
+from concurrent.futures import Future, ProcessPoolExecutor
+from scipy.interpolate import RBFInterpolator
+
+# typing
+from typing import Any, Dict, List, Optional, Tuple
+
+from HIL.optimization.extract_cost import CostBuffer
+from HIL.optimization.HIL import HIL
+from HIL.optimization.session_store import SessionStore
+
+
+class Landscape:
+    """
+    Cost landscape of a simulated subject, lower is better.
+    Landscapes are sent to the worker processes, so they need to be picklable (defined at module level).
+    """
+    def __call__(self, x: np.ndarray) -> float:
+        raise NotImplementedError
+
+    def minimum(self, bounds: np.ndarray, n_points: int = 10000) -> float:
+        """Minimum of the cost on a grid over the bounds
+
+        Args:
+            bounds (np.ndarray): 2 x n_parms lower and upper bounds
+            n_points (int, optional): approximate number of grid points. Defaults to 10000.
+        """
+        n_parms = bounds.shape[1]
+        n_axis = max(2, math.ceil(n_points ** (1 / n_parms)))
+        axes = [np.linspace(bounds[0, i], bounds[1, i], n_axis) for i in range(n_parms)]
+        grid = np.stack(np.meshgrid(*axes), axis=-1).reshape(-1, n_parms)
+        return min(self(point) for point in grid)
+
+
+class Sinusoid1D(Landscape):
+    """The 1-D test objective of BayesianOptimization, as a cost over [low, high]"""
+    def __init__(self, low: float = 0, high: float = 100) -> None:
+        self.low = low
+        self.high = high
+
+    def __call__(self, x: np.ndarray) -> float:
+        x = 0.2 + (np.asarray(x).reshape(-1)[0] - self.low) / (self.high - self.low)
+        return float((1.4 - 3.0 * x) * np.sin(18.0 * x))
+
+
+class Quadratic(Landscape):
+    """Bowl shaped cost around an optimum, cost = base + scale * ||(x - optimum) / width||^2"""
+    def __init__(self, optimum: np.ndarray, width: np.ndarray, scale: float = 1.0, base: float = 0.0) -> None:
+        self.optimum = np.asarray(optimum, dtype=float)
+        self.width = np.asarray(width, dtype=float)
+        self.scale = scale
+        self.base = base
+
+    def __call__(self, x: np.ndarray) -> float:
+        distance = (np.asarray(x, dtype=float).reshape(-1) - self.optimum) / self.width
+        return float(self.base + self.scale * np.sum(distance ** 2))
+
+
+class Proxy(Landscape):
+    """Cheap proxy of a cost for the multi fidelity simulations, cost * scale + offset with a sinusoidal bias
+    along the parameters"""
+    def __init__(self, landscape: Landscape, scale: float = 1.0, offset: float = 0.0, bias: float = 0.0,
+                 period: float = 50.0) -> None:
+        self.landscape = landscape
+        self.scale = scale
+        self.offset = offset
+        self.bias = bias
+        self.period = period
+
+    def __call__(self, x: np.ndarray) -> float:
+        phase = 2 * np.pi * np.sum(np.asarray(x, dtype=float)) / self.period
+        return float(self.scale * self.landscape(x) + self.offset + self.bias * np.sin(phase))
+
+
+class RecordedLandscape(Landscape):
+    """Cost interpolated from recorded parameters and costs (thin plate spline with smoothing)"""
+    def __init__(self, x: np.ndarray, cost: np.ndarray, smoothing: float = 1.0) -> None:
+        self.x = np.asarray(x, dtype=float).reshape(len(cost), -1)
+        self.cost = np.asarray(cost, dtype=float).reshape(-1)
+        self._interpolator = RBFInterpolator(self.x, self.cost, smoothing=smoothing)
+
+    @classmethod
+    def from_session(cls, path: str, smoothing: float = 1.0) -> "RecordedLandscape":
+        """Landscape from the bouts of a saved session, HIL stores the negated cost
+
+        Args:
+            path (str): session file
+        """
+        bouts = list(SessionStore(path).records("bout"))
+        x = np.array([bout["x"] for bout in bouts])
+        cost = -np.array([bout["y"] for bout in bouts])
+        return cls(x, cost, smoothing)
+
+    def __call__(self, x: np.ndarray) -> float:
+        return float(self._interpolator(np.asarray(x, dtype=float).reshape(1, -1))[0])
+
+
+class SimulatedCost:
+    """
+    Stand-in for ExtractCost, every window query adds one noisy sample of the landscape at the parameter of
+    the running bout. After a parameter change the cost approaches the new steady state with time constant tau.
+    """
+    def __init__(self, session: "SimulatedHIL", landscape: Landscape, noise_std: float, sample_period: float,
+                 tau: float, rng: np.random.Generator) -> None:
+        self.cost_name = "simulated"
+        self.session = session
+        self.landscape = landscape
+        self.noise_std = noise_std
+        self.sample_period = sample_period
+        self.tau = tau
+        self.rng = rng
+        self.time = 0.0
+        self.buffer = CostBuffer()
+        self._parameter: Optional[np.ndarray] = None
+        self._level = 0.0
+        self._previous_level = 0.0
+        self._change_time = 0.0
+
+    def window(self, start: float = -np.inf, end: float = np.inf) -> Tuple[np.ndarray, np.ndarray]:
+        # the cost and proxy streams share the simulated clock
+        self.time = max(self.time, self.session._clock()) + self.sample_period
+        session = self.session
+        parameter = session.x[session.n] if session.n < len(session.x) else self._parameter
+        if parameter is not None:
+            if self._parameter is None or not np.array_equal(parameter, self._parameter):
+                self._previous_level = self._value(self.time)
+                self._parameter = parameter
+                self._level = self.landscape(parameter)
+                self._change_time = self.time
+            self.buffer.append([self._value(self.time) + self.noise_std * self.rng.standard_normal()], [self.time])
+        return self.buffer.window(start, end)
+
+    def close(self) -> None:
+        pass
+
+    def _value(self, t: float) -> float:
+        if self._parameter is None:
+            return 0.0
+        if self.tau <= 0:
+            return self._level
+        return self._level + (self._previous_level - self._level) * math.exp(-(t - self._change_time) / self.tau)
+
+
+class _NullOutlet:
+    """Stand-in for the Change_parm outlet, keeps the markers"""
+    def __init__(self) -> None:
+        self.markers: List = []
+
+    def push_sample(self, sample: List, timestamp: float = 0.0) -> None:
+        self.markers.append((timestamp, sample))
+
+
+class InlineScheduler:
+    """Runs the BayesianOptimization methods synchronously and times the optimization steps"""
+    def __init__(self) -> None:
+        self.step_times: List[float] = []
+
+    def submit(self, session: HIL, method: str, *args, **kwargs) -> Future:
+        future: Future = Future()
+        start = time.perf_counter()
+        try:
+            future.set_result(getattr(session.BO, method)(*args, **kwargs))
+        except Exception as e:
+            future.set_exception(e)
+        if method == "run":
+            self.step_times.append(time.perf_counter() - start)
+        return future
+
+
+class SimulatedHIL(HIL):
+    """
+    HIL with the stream, the outlet, the operator prompts and the clock replaced by simulation.
+    """
+    def __init__(self, args: dict, landscape: Landscape, noise_std: float = 0.1, sample_period: float = 1.0,
+                 tau: float = 0.0, seed: int = 0, proxy: Optional[Landscape] = None) -> None:
+        """
+        Args:
+            args (dict): HIL config
+            landscape (Landscape): cost of the simulated subject
+            noise_std (float, optional): standard deviation of the noise on every cost sample. Defaults to 0.1.
+            sample_period (float, optional): seconds between two cost samples. Defaults to 1.0.
+            tau (float, optional): time constant (s) of the transition to a new steady state. Defaults to 0.0.
+            seed (int, optional): seed of the noise and of the initial parameters. Defaults to 0.
+            proxy (Landscape, optional): proxy cost of the multi fidelity optimization. Defaults to None.
+        """
+        self.landscape = landscape
+        self.proxy_landscape = proxy
+        self.noise_std = noise_std
+        self.sample_period = sample_period
+        self.tau = tau
+        self.rng = np.random.default_rng(seed)
+        super().__init__(args, scheduler=InlineScheduler())
+
+    def _outlet_cost(self) -> None:
+        self.outlet = _NullOutlet()
+
+    def _start_cost(self, args: dict) -> None:
+        self.cost_time = 0
+        self.cost = SimulatedCost(self, self.landscape, self.noise_std, self.sample_period, self.tau, self.rng) #type: ignore
+
+    def _start_proxy(self, args: dict) -> SimulatedCost: #type: ignore
+        assert self.proxy_landscape is not None, "multi fidelity simulation needs a proxy landscape"
+        return SimulatedCost(self, self.proxy_landscape, self.noise_std, self.sample_period, self.tau, self.rng)
+
+    def _prompt(self, message: str) -> str:
+        return "Y"
+
+    def _clock(self) -> float:
+        proxy = getattr(self, "proxy", None)
+        return self.cost.time if proxy is None else max(self.cost.time, proxy.time)
+
+    def _sleep(self, seconds: float) -> None:
+        self.cost.time += seconds
+
+    def _wait(self, timeout: float) -> None:
+        pass
+
+
+def run_session(args: dict, landscape: Landscape, seed: int, noise_std: float = 0.1, sample_period: float = 1.0,
+                tau: float = 0.0, save_path: Optional[str] = None, proxy: Optional[Landscape] = None) -> Dict[str, Any]:
+    """Run one simulated session
+
+    Args:
+        args (dict): HIL config
+        landscape (Landscape): cost of the simulated subject
+        seed (int): seed of the session
+        save_path (str, optional): directory for the session file, a temporary one if None. Defaults to None.
+        proxy (Landscape, optional): proxy cost of the multi fidelity optimization. Defaults to None.
+
+    Returns:
+        Dict[str, Any]: evaluated parameters "x", their true cost "cost", "fidelity" of every bout, "step_time" of
+            every optimization step and "duration" of the session in simulated seconds
+    """
+    np.random.seed(seed)
+    torch.manual_seed(seed)
+    args = copy.deepcopy(args)
+    with tempfile.TemporaryDirectory() as tmp, contextlib.redirect_stdout(io.StringIO()):
+        args['Optimization']['model_save_path'] = save_path or tmp + "/"
+        session = SimulatedHIL(args, landscape, noise_std, sample_period, tau, seed, proxy)
+        session.start()
+    x = session.x_opt.reshape(len(session.x_opt), -1)
+    return {
+        "x": x,
+        "cost": np.array([landscape(point) for point in x]),
+        "fidelity": session.fidelity_opt,
+        "step_time": np.array(session.scheduler.step_times), #type: ignore
+        "duration": session.cost.time,
+    }
+
+
+def _run_session_worker(job: Tuple) -> Dict[str, Any]:
+    torch.set_num_threads(1)
+    return run_session(*job)
+
+
+def simulate(args: dict, landscape: Landscape, n_sessions: int = 10, noise_std: float = 0.1, sample_period: float = 1.0,
+             tau: float = 0.0, n_workers: Optional[int] = None, seed: int = 0, proxy: Optional[Landscape] = None) -> Dict[str, np.ndarray]:
+    """Run seeded simulated sessions on a process pool
+
+    Args:
+        args (dict): HIL config, the Cost time is the bout duration in simulated seconds
+        landscape (Landscape): cost of the simulated subject
+        n_sessions (int, optional): number of sessions. Defaults to 10.
+        noise_std (float, optional): standard deviation of the noise on every cost sample. Defaults to 0.1.
+        sample_period (float, optional): seconds between two cost samples. Defaults to 1.0.
+        tau (float, optional): time constant (s) of the transition to a new steady state. Defaults to 0.0.
+        n_workers (int, optional): worker processes, all cores if None. Defaults to None.
+        seed (int, optional): seed of the first session, the others use the next seeds. Defaults to 0.
+        proxy (Landscape, optional): proxy cost of the multi fidelity optimization. Defaults to None.
+
+    Returns:
+        Dict[str, np.ndarray]: "regret" (sessions x bouts) of the best parameter evaluated with the target cost so
+            far, held after a session stopped early and over the proxy bouts, "n_bouts" (sessions) recorded bouts,
+            "step_time" (sessions x steps) wall clock of every optimization step, "duration" (sessions) simulated
+            seconds of every session
+    """
+    bounds = np.array(list(args['Optimization']['range']), dtype=float).reshape(2, args['Optimization']['n_parms'])
+    minimum = landscape.minimum(bounds)
+    jobs = [(args, landscape, seed + i, noise_std, sample_period, tau, None, proxy) for i in range(n_sessions)]
+    with ProcessPoolExecutor(max_workers=n_workers or os.cpu_count(), mp_context=multiprocessing.get_context("spawn")) as pool:
+        sessions = list(pool.map(_run_session_worker, jobs))
+
+    n_bouts = max(len(session["cost"]) for session in sessions)
+    n_steps = min(len(session["step_time"]) for session in sessions)
+    # a proxy bout does not measure the target cost
+    regret = [np.minimum.accumulate(np.where(session["fidelity"] == 0, session["cost"], np.inf)) - minimum for session in sessions]
+    return {
+        "regret": np.array([np.pad(r, (0, n_bouts - len(r)), mode="edge") for r in regret]),
+        "n_bouts": np.array([len(session["cost"]) for session in sessions]),
+        "step_time": np.array([session["step_time"][:n_steps] for session in sessions]),
+        "duration": np.array([session["duration"] for session in sessions]),
+    }
@@ -0,0 +1,50 @@
+import math
+
+# typing
+from typing import Dict, Optional
+
+
+class StoppingRule:
+    """
+    End the optimization early once it has converged: every enabled diagnostic of BayesianOptimization
+    (max acquisition value, distance between consecutive proposals relative to the range, posterior std at
+    the incumbent) stays below its threshold for patience consecutive steps, after at least min_steps bouts.
+    """
+    DIAGNOSTICS = ("acquisition", "step_distance", "incumbent_std")
+
+    def __init__(self, args: dict) -> None:
+        """
+        Args:
+            args (dict): stopping config, a threshold for any of acquisition, step_distance and incumbent_std
+                (null disables it), patience and min_steps
+        """
+        self.thresholds: Dict[str, float] = {k: args[k] for k in self.DIAGNOSTICS if args.get(k) is not None}
+        self.patience = args.get('patience', 2)
+        self.min_steps = args.get('min_steps', 0)
+        self._converged_steps = 0
+
+    @property
+    def enabled(self) -> bool:
+        return len(self.thresholds) > 0
+
+    def update(self, diagnostics: Dict[str, float], n: int) -> bool:
+        """Add the diagnostics of a step
+
+        Args:
+            diagnostics (Dict[str, float]): diagnostics of the step
+            n (int): number of recorded bouts
+
+        Returns:
+            bool: the optimization can stop
+        """
+        if not self.enabled:
+            return False
+        converged = all(not math.isnan(diagnostics.get(k, math.nan)) and diagnostics[k] < threshold
+                        for k, threshold in self.thresholds.items())
+        self._converged_steps = self._converged_steps + 1 if converged else 0
+        return n >= self.min_steps and self._converged_steps >= self.patience
+
+    def reason(self, diagnostics: Optional[Dict[str, float]] = None) -> str:
+        """Description of the stop"""
+        values = ", ".join(f"{k} {diagnostics[k]:.4g} < {v}" for k, v in self.thresholds.items()) if diagnostics else ""
+        return f"converged for {self._converged_steps} steps: {values}"
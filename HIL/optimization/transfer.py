@@ -0,0 +1,142 @@
+import logging
+import os
+import numpy as np
+import torch
+from botorch.models import ApproximateGPyTorchModel
+from gpytorch.priors import LogNormalPrior, NormalPrior
+
+# typing
+from typing import Any, Dict, List, Optional, Tuple
+
+from HIL.optimization.session_store import load_session, session_paths
+
+
+def _constrained(state: Dict[str, torch.Tensor], raw_name: str) -> Optional[torch.Tensor]:
+    """Value of a constrained hyperparameter from its raw value and the constraint bounds saved with it"""
+    if raw_name not in state:
+        return None
+    raw = state[raw_name].double()
+    lower = state.get(f"{raw_name}_constraint.lower_bound")
+    upper = state.get(f"{raw_name}_constraint.upper_bound")
+    if lower is None:
+        return raw
+    if upper is not None and torch.isfinite(upper).all():
+        # Interval constraint
+        return lower + (upper - lower) * torch.sigmoid(raw)
+    # GreaterThan constraint
+    return lower + torch.nn.functional.softplus(raw)
+
+
+class TransferPrior:
+    """
+    Informative GP prior built from the sessions of previous subjects. The fitted hyperparameters of every
+    session (lengthscale, outputscale, noise) give log normal hyperpriors and the level of their costs a
+    normal prior on the constant mean. The priors are added to the marginal likelihood of the fit and the
+    hyperparameters start at the prior medians, so a new subject needs fewer exploration bouts.
+    Sessions are read from the session stores (session_*.jsonl) and the legacy iter_* directories
+    (model.pth and data.csv).
+    """
+    HYPERPARAMETERS = {
+        "lengthscale": "covar_module.base_kernel.raw_lengthscale",
+        "outputscale": "covar_module.raw_outputscale",
+        "noise": "likelihood.noise_covar.raw_noise",
+    }
+
+    def __init__(self, samples: Dict[str, np.ndarray], mean: np.ndarray, min_scale: float = 0.5) -> None:
+        """
+        Args:
+            samples (Dict[str, np.ndarray]): fitted values of every hyperparameter, sessions x values
+            mean (np.ndarray): mean cost level (y) of every session
+            min_scale (float, optional): smallest std of the priors, log scale for the hyperparameters and
+                relative to the spread of the costs for the mean, so few sessions do not give an overconfident prior. Defaults to 0.5.
+        """
+        self.n_sessions = len(mean)
+        self.priors: Dict[str, Tuple[float, Any]] = {}
+        for name, values in samples.items():
+            if not len(values):
+                continue
+            log_values = np.log(np.clip(values, 1e-6, None))
+            loc = torch.tensor(log_values.mean(axis=0), dtype=torch.double)
+            scale = torch.tensor(np.maximum(log_values.std(axis=0), min_scale), dtype=torch.double)
+            self.priors[name] = (loc.exp(), LogNormalPrior(loc, scale))
+        if len(mean):
+            spread = max(float(np.std(mean)), min_scale * max(float(np.abs(mean).mean()), 1.0))
+            self.priors["mean"] = (torch.tensor(float(np.mean(mean)), dtype=torch.double),
+                                   NormalPrior(float(np.mean(mean)), spread))
+
+    @classmethod
+    def from_sessions(cls, paths: List[str], n_parms: int = 1, min_scale: float = 0.5,
+                      exclude: Optional[str] = None) -> "TransferPrior":
+        """Prior from the saved sessions
+
+        Args:
+            paths (List[str]): session files, iter_* directories or directories containing them
+            n_parms (int, optional): number of parameters, sessions with another number are skipped. Defaults to 1.
+            min_scale (float, optional): smallest std of the priors. Defaults to 0.5.
+            exclude (str, optional): session file to skip (the current one). Defaults to None.
+
+        Returns:
+            TransferPrior: prior of the sessions
+        """
+        samples: Dict[str, List[np.ndarray]] = {name: [] for name in cls.HYPERPARAMETERS}
+        mean: List[float] = []
+        for path in session_paths(paths):
+            if exclude is not None and os.path.abspath(path) == os.path.abspath(exclude):
+                continue
+            session = load_session(path)
+            if session is None:
+                continue
+            x, y, state = session
+            if x.size != len(y) * n_parms:
+                continue
+            # the kernel and mean of a variational GP are saved under its gpytorch model
+            state = {k[len("model."):] if k.startswith("model.") else k: v for k, v in state.items()}
+            mean.append(float(np.mean(y)))
+            for name, raw_name in cls.HYPERPARAMETERS.items():
+                value = _constrained(state, raw_name)
+                if value is not None and (name != "lengthscale" or value.numel() in (1, n_parms)):
+                    samples[name].append(value.flatten().expand(n_parms if name == "lengthscale" else 1).numpy())
+        prior = cls({name: np.array(values) for name, values in samples.items()}, np.array(mean), min_scale)
+        logging.getLogger().info(f"Transfer prior from {prior.n_sessions} sessions")
+        return prior
+
+    def apply(self, model: Any, initialize: bool = True) -> None:
+        """Register the priors on the hyperparameters of a GP
+
+        Args:
+            model (Any): SingleTaskGP, FixedNoiseGP or SingleTaskVariationalGP
+            initialize (bool, optional): start the hyperparameters at the prior medians. Defaults to True.
+        """
+        # the kernel and mean of a variational GP are in its gpytorch model
+        gp = model.model if isinstance(model, ApproximateGPyTorchModel) else model
+        base_kernel = gp.covar_module.base_kernel
+        noise_covar = getattr(model.likelihood, "noise_covar", None)
+        # module and public name of every hyperparameter, the priors act on the constrained values
+        targets = {
+            "lengthscale": (base_kernel, "lengthscale"),
+            "outputscale": (gp.covar_module, "outputscale"),
+            "mean": (gp.mean_module, "constant"),
+        }
+        # a fixed noise GP has no learned noise
+        if noise_covar is not None and hasattr(noise_covar, "raw_noise"):
+            targets["noise"] = (noise_covar, "noise")
+        for name, (module, attribute) in targets.items():
+            if name not in self.priors:
+                continue
+            median, prior = self.priors[name]
+            if name == "lengthscale" and median.numel() != module.lengthscale.numel():
+                # one lengthscale for all the parameters
+                median, prior = median.log().mean().exp(), LogNormalPrior(prior.loc.mean(), prior.scale.mean())
+            module.register_prior(f"transfer_{name}_prior", prior.to(gp.train_targets), attribute)
+            if initialize:
+                module.initialize(**{attribute: self._feasible(module, name, median).to(gp.train_targets)})
+
+    @staticmethod
+    def _feasible(module: Any, name: str, value: torch.Tensor) -> torch.Tensor:
+        """Prior median inside the constraint of the hyperparameter"""
+        constraint = None if name == "mean" else getattr(module, f"raw_{name}_constraint", None)
+        if constraint is None:
+            return value
+        lower = constraint.lower_bound.to(value) + 1e-6
+        upper = constraint.upper_bound.to(value) - 1e-6
+        return torch.max(torch.min(value, upper), lower)
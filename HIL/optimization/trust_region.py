@@ -0,0 +1,112 @@
+import math
+import torch
+
+# typing
+from typing import Any, Dict, Optional, Tuple
+
+
+class TrustRegion:
+    """
+    TuRBO style trust region. The acquisition is optimized in a box around the incumbent, its side (relative to the
+    range) doubles after success_tolerance consecutive improving steps and halves after failure_tolerance consecutive
+    steps without improvement. A region shrunk below min_length restarts at the initial length around the incumbent.
+    With an ARD kernel the sides are stretched along the long lengthscales.
+    """
+    def __init__(self, n_parms: int, length: float = 0.8, min_length: float = 0.5 ** 7, max_length: float = 1.6,
+                 success_tolerance: int = 3, failure_tolerance: Optional[int] = None, min_improvement: float = 1e-3) -> None:
+        """
+        Args:
+            n_parms (int): number of parameters
+            length (float, optional): initial side of the region relative to the range. Defaults to 0.8.
+            min_length (float, optional): side under which the region restarts. Defaults to 0.5**7.
+            max_length (float, optional): largest side. Defaults to 1.6.
+            success_tolerance (int, optional): improving steps before the region expands. Defaults to 3.
+            failure_tolerance (int, optional): steps without improvement before it shrinks, None for max(4, n_parms). Defaults to None.
+            min_improvement (float, optional): improvement of the best observation, relative to its magnitude,
+                counted as a success. Defaults to 1e-3.
+        """
+        self.n_parms = n_parms
+        self.initial_length = length
+        self.min_length = min_length
+        self.max_length = max_length
+        self.success_tolerance = success_tolerance
+        self.failure_tolerance = failure_tolerance or max(4, n_parms)
+        self.min_improvement = min_improvement
+        self.length = length
+        self.n_success = 0
+        self.n_failure = 0
+        self.n_restarts = 0
+
+    def update(self, y_new: torch.Tensor, best: float) -> None:
+        """Expand or shrink the region with the costs observed since the previous step
+
+        Args:
+            y_new (torch.Tensor): new observations (maximized)
+            best (float): best observation before them
+        """
+        if y_new.max().item() > best + self.min_improvement * abs(best):
+            self.n_success += 1
+            self.n_failure = 0
+        else:
+            self.n_success = 0
+            self.n_failure += 1
+
+        if self.n_success >= self.success_tolerance:
+            self.length = min(2.0 * self.length, self.max_length)
+            self.n_success = 0
+        elif self.n_failure >= self.failure_tolerance:
+            self.length /= 2.0
+            self.n_failure = 0
+        if self.length < self.min_length:
+            self.length = self.initial_length
+            self.n_restarts += 1
+
+    def bounds(self, center: torch.Tensor, range: torch.Tensor, lengthscale: Optional[torch.Tensor] = None) -> torch.Tensor:
+        """Box of the region around the center, within the range
+
+        Args:
+            center (torch.Tensor): incumbent parameter
+            range (torch.Tensor): 2 x n_parms lower and upper bounds of the parameters
+            lengthscale (torch.Tensor, optional): lengthscales of an ARD kernel, relative to the range. Defaults to None.
+
+        Returns:
+            torch.Tensor: 2 x n_parms lower and upper bounds of the region
+        """
+        span = range[1] - range[0]
+        weights = torch.ones_like(span)
+        if lengthscale is not None and lengthscale.numel() == self.n_parms:
+            # the volume is kept, the sides are stretched along the long lengthscales
+            weights = lengthscale.reshape(-1).to(span) / torch.exp(torch.log(lengthscale.reshape(-1).to(span)).mean())
+        half = weights * self.length * span / 2
+        center = center.reshape(-1)
+        return torch.stack((torch.max(center - half, range[0]), torch.min(center + half, range[1])))
+
+    @staticmethod
+    def volume(bounds: torch.Tensor, range: torch.Tensor) -> float:
+        """Fraction of the range covered by the bounds"""
+        return torch.prod((bounds[1] - bounds[0]) / (range[1] - range[0])).item()
+
+    def budget(self, num_restarts: int, raw_samples: int, volume: float) -> Tuple[int, int]:
+        """Acquisition optimization budget in proportion to the volume of the region
+
+        Args:
+            num_restarts (int): restarts over the whole range
+            raw_samples (int): raw samples over the whole range
+            volume (float): fraction of the range covered by the region
+
+        Returns:
+            Tuple[int, int]: num_restarts, raw_samples
+        """
+        restarts = max(2, math.ceil(num_restarts * volume))
+        return restarts, max(restarts, math.ceil(raw_samples * volume))
+
+    def state(self) -> Dict[str, Any]:
+        """State saved with the optimization step"""
+        return {"length": self.length, "n_success": self.n_success, "n_failure": self.n_failure, "n_restarts": self.n_restarts}
+
+    def load(self, state: Dict[str, Any]) -> None:
+        """Continue from a saved state"""
+        self.length = state["length"]
+        self.n_success = state["n_success"]
+        self.n_failure = state["n_failure"]
+        self.n_restarts = state["n_restarts"]
@@ -1,3 +1,4 @@
+import sys
 import yaml
 # import numpy as np
 
@@ -14,6 +15,9 @@ from HIL.optimization.HIL import HIL
 def run():
 
     args = yaml.safe_load(open('configs/ECG_config.yml','r'))
+    # python scripts/ECG_optimization.py --resume continues the last saved session
+    if '--resume' in sys.argv:
+        args['Optimization']['resume'] = True
     hil = HIL(args)
     hil.start()
 
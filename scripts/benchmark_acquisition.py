@@ -0,0 +1,52 @@
+"""Benchmark of the acquisition optimization budget of the BayesianOptimization.
+
+Compares the time to the next parameter and the achieved acquisition value of the
+previous fixed budget (1000 restarts, 2000 raw samples) against the budget scaled
+with the number of parameters, with and without the seeds of the previous optimization.
+"""
+import time
+import numpy as np
+
+# HIL toolbox import
+from HIL.optimization.BO import BayesianOptimization
+
+
+N_POINTS = 8 # number of observed points
+N_REPEATS = 3 # repeats of each setting
+LEGACY = {"num_restarts": 1000, "raw_samples": 2000}
+
+
+def objective(x: np.ndarray) -> np.ndarray:
+    # smooth multi-modal test function on [0, 100]^d
+    x = x / 100
+    return (np.sin(6 * x) * (1 - x)).sum(axis=1, keepdims=True)
+
+
+def benchmark(n_parms: int, settings: dict, seeded: bool) -> tuple:
+    np.random.seed(0)
+    bounds = np.array([[0.] * n_parms, [100.] * n_parms])
+    BO = BayesianOptimization(n_parms=n_parms, range=bounds, model_save_path="/tmp/HIL_benchmark/", **settings)
+    x = np.random.random((N_POINTS, n_parms)) * 100
+    BO.run(x, objective(x))
+
+    acq = BO._acquisition()
+    times, values = [], []
+    for _ in range(N_REPEATS):
+        if not seeded:
+            BO._seed_candidates = None
+        start = time.perf_counter()
+        _, value = BO._optimize_acquisition(acq)
+        times.append(time.perf_counter() - start)
+        values.append(value.item())
+    return np.mean(times), np.max(values)
+
+
+def run():
+    print(f"{'n_parms':>8} {'setting':>16} {'time (s)':>10} {'acq value':>12}")
+    for n_parms in [1, 2, 4]:
+        for name, settings, seeded in [("legacy", LEGACY, False), ("adaptive", {}, False), ("adaptive+seeds", {}, True)]:
+            mean_time, value = benchmark(n_parms, settings, seeded)
+            print(f"{n_parms:>8} {name:>16} {mean_time:>10.3f} {value:>12.5f}")
+
+
+run()
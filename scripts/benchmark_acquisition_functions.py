@@ -0,0 +1,74 @@
+"""Micro-benchmark of the acquisition functions of the BayesianOptimization.
+
+Times one evaluation of every acquisition on a batch of candidates, with and without the gradient,
+and the full acquisition optimization on a 1-D problem, against the previous 200-sample Monte-Carlo
+qNEI (IID samples).
+"""
+import time
+import numpy as np
+import torch
+from botorch.acquisition import qNoisyExpectedImprovement
+from botorch.sampling import IIDNormalSampler
+
+# HIL toolbox import
+from HIL.optimization.BO import BayesianOptimization
+from HIL.optimization.acquisition import ACQUISITIONS
+
+
+N_POINTS = 8 # number of observed points
+N_CANDIDATES = 1000 # candidates per evaluation
+N_REPEATS = 20 # repeats of the evaluation
+
+
+def objective(x: np.ndarray) -> np.ndarray:
+    # 1-D test objective of BayesianOptimization on [0, 100]
+    x = 0.2 + x / 100
+    return -(1.4 - 3.0 * x) * np.sin(18.0 * x)
+
+
+def legacy(BO: BayesianOptimization) -> qNoisyExpectedImprovement:
+    return qNoisyExpectedImprovement(BO.model, BO.x, sampler=IIDNormalSampler(200, seed=1234))
+
+
+def benchmark(name: str) -> tuple:
+    np.random.seed(0)
+    BO = BayesianOptimization(range=np.array([0, 100]), acq="ei" if name == "legacy qnei" else name,
+                              model_save_path="/tmp/HIL_benchmark/")
+    x = np.random.random((N_POINTS, 1)) * 100
+    BO.run(x, objective(x))
+    acq = legacy(BO) if name == "legacy qnei" else BO._acquisition()
+    candidates = torch.linspace(0, 100, N_CANDIDATES, dtype=torch.double).reshape(-1, 1, 1)
+
+    with torch.no_grad():
+        acq(candidates)
+        start = time.perf_counter()
+        for _ in range(N_REPEATS):
+            acq(candidates)
+        evaluation = (time.perf_counter() - start) / N_REPEATS
+
+    # value and gradient, as in the optimization
+    start = time.perf_counter()
+    for _ in range(N_REPEATS):
+        points = candidates.clone().requires_grad_(True)
+        acq(points).sum().backward()
+    gradient = (time.perf_counter() - start) / N_REPEATS
+
+    BO._seed_candidates = None
+    start = time.perf_counter()
+    parameter, _ = BO._optimize_acquisition(acq)
+    optimization = time.perf_counter() - start
+    return evaluation, gradient, optimization, parameter.item()
+
+
+def run():
+    names = ["legacy qnei"] + list(ACQUISITIONS)
+    results = {name: benchmark(name) for name in names}
+    reference = results["legacy qnei"][0]
+    reference_gradient = results["legacy qnei"][1]
+    print(f"{'acquisition':>12} {'eval (ms)':>10} {'speedup':>8} {'grad (ms)':>10} {'speedup':>8} {'optimize (s)':>13} {'next x':>8}")
+    for name, (evaluation, gradient, optimization, parameter) in results.items():
+        print(f"{name:>12} {evaluation * 1e3:>10.3f} {reference / evaluation:>8.1f} {gradient * 1e3:>10.3f} "
+              f"{reference_gradient / gradient:>8.1f} {optimization:>13.3f} {parameter:>8.2f}")
+
+
+run()
@@ -1,6 +1,7 @@
 """This code script is for optimization of the metabolic cost estimation and optimization using the HIL toolbox.
 """
 
+import sys
 import yaml 
 
 # HIL toolbox import
@@ -11,6 +12,9 @@ from HIL.optimization.HIL import HIL
 def run():
     
         args = yaml.safe_load(open('configs/Met_config.yml','r'))
+        # python scripts/metabolic_optimization.py --resume continues the last saved session
+        if '--resume' in sys.argv:
+            args['Optimization']['resume'] = True
         hil = HIL(args)
         hil.start()
 
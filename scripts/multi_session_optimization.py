@@ -0,0 +1,26 @@
+"""Run several HIL sessions (e.g. one per treadmill) in one process with a shared optimization pool.
+
+python scripts/multi_session_optimization.py configs/subject_1.yml configs/subject_2.yml
+
+Each config needs its own Cost Name (cost stream) and Optimization model_save_path, and can set
+Session: name, priority (higher priority sessions get the next free worker first).
+"""
+import sys
+import yaml
+
+# HIL toolbox import
+from HIL.optimization.session_manager import SessionManager
+
+
+N_WORKERS = 2 # worker processes shared by all the sessions
+THREADS_PER_WORKER = 1 # torch threads of each worker
+
+
+def run():
+    configs = [yaml.safe_load(open(path, 'r')) for path in sys.argv[1:]]
+    manager = SessionManager(configs, n_workers=N_WORKERS, threads_per_worker=THREADS_PER_WORKER)
+    manager.start()
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,45 @@
+"""Offline simulation of HIL sessions against a synthetic or recorded cost landscape.
+
+python scripts/simulate_hil.py configs/ECG_config.yml [models/session_xxx.jsonl]
+
+Without a session file the cost is the 1-D test function of the BayesianOptimization over the
+config range, with a session file the cost is interpolated from its recorded bouts. Prints the mean
+regret (best evaluated cost minus the minimum) per bout and the wall clock per optimization step.
+"""
+import sys
+import yaml
+
+# HIL toolbox import
+from HIL.optimization.simulation import RecordedLandscape, Sinusoid1D, simulate
+
+
+N_SESSIONS = 32 # seeded sessions
+N_WORKERS = None # worker processes, all cores if None
+NOISE_STD = 0.2 # noise of every cost sample
+SAMPLE_PERIOD = 1.0 # seconds between two cost samples
+TAU = 0.0 # time constant (s) of the transition after a parameter change
+
+
+def run():
+    config = yaml.safe_load(open(sys.argv[1], 'r'))
+    if len(sys.argv) > 2:
+        landscape = RecordedLandscape.from_session(sys.argv[2])
+    else:
+        landscape = Sinusoid1D(*config['Optimization']['range'])
+
+    result = simulate(config, landscape, n_sessions=N_SESSIONS, noise_std=NOISE_STD, sample_period=SAMPLE_PERIOD,
+                      tau=TAU, n_workers=N_WORKERS)
+
+    regret = result["regret"]
+    print(f"{'bout':>6} {'mean regret':>12} {'std':>10}")
+    for i in range(regret.shape[1]):
+        print(f"{i + 1:>6} {regret[:, i].mean():>12.4f} {regret[:, i].std():>10.4f}")
+
+    step_time = result["step_time"]
+    print(f"{'step':>6} {'mean time (s)':>14} {'max time (s)':>13}")
+    for i in range(step_time.shape[1]):
+        print(f"{i + 1:>6} {step_time[:, i].mean():>14.3f} {step_time[:, i].max():>13.3f}")
+
+
+if __name__ == "__main__":
+    run()
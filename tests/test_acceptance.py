@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+
+from HIL.optimization.acceptance import BoutAcceptance
+
+
+def test_defaults():
+    acceptance = BoutAcceptance({})
+
+    assert not acceptance.auto
+    assert acceptance.min_samples == 6
+    assert acceptance.override() is None
+
+
+def test_auto_mode():
+    assert BoutAcceptance({"mode": "auto"}).auto
+
+
+def test_ready_with_min_samples():
+    acceptance = BoutAcceptance({"min_samples": 3})
+
+    assert not acceptance.ready([1.0, 2.0])
+    assert acceptance.ready([1.0, 2.0, 3.0])
+
+
+def test_accepts_a_clean_bout():
+    accepted, reason = BoutAcceptance({"min_samples": 3}).check([1.0, 1.1, 0.9, 1.0])
+
+    assert accepted
+    assert reason.startswith("4 samples")
+
+
+def test_rejects_too_few_samples():
+    accepted, reason = BoutAcceptance({"min_samples": 6}).check([1.0] * 5)
+
+    assert not accepted
+    assert "less than 6" in reason
+
+
+def test_rejects_nan():
+    accepted, reason = BoutAcceptance({"min_samples": 3}).check([1.0, np.nan, 1.0, 1.0])
+
+    assert not accepted
+    assert "1 NaN" in reason
+
+
+def test_nan_allowed_when_disabled():
+    accepted, _ = BoutAcceptance({"min_samples": 3, "reject_nan": False}).check([1.0, np.nan, 1.0, 1.2])
+
+    assert accepted
+
+
+@pytest.mark.parametrize("min_std, max_std, accepted", [
+    (None, None, True),
+    (0.5, None, False), # flat cost, e.g. a disconnected sensor
+    (None, 0.05, False), # noisy cost
+    (0.01, 0.5, True),
+])
+def test_std_bounds(min_std, max_std, accepted):
+    acceptance = BoutAcceptance({"min_samples": 3, "min_std": min_std, "max_std": max_std})
+
+    assert acceptance.check([1.0, 1.1, 0.9, 1.0, 1.1])[0] == accepted
+
+
+def test_std_of_the_last_window_samples():
+    # a large jump at the start of the bout is outside the window
+    data = [10.0, 0.0, 1.0, 1.0, 1.0, 1.0]
+
+    assert BoutAcceptance({"min_samples": 3, "window": 4, "max_std": 0.1}).check(data)[0]
+    assert not BoutAcceptance({"min_samples": 3, "window": 6, "max_std": 0.1}).check(data)[0]
+
+
+def test_override_uses_the_last_command(monkeypatch):
+    acceptance = BoutAcceptance({})
+    monkeypatch.setattr(acceptance, "_pull", lambda: ["reject", "noise", "accept"])
+    assert acceptance.override() is True
+
+    monkeypatch.setattr(acceptance, "_pull", lambda: ["accept", "reject"])
+    assert acceptance.override() is False
+
+    monkeypatch.setattr(acceptance, "_pull", lambda: ["pause"])
+    assert acceptance.override() is None
@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+
+from HIL.optimization.epochs import EpochEngine
+
+
+# one sample per second, three epochs starting at the markers 0, 10 and 20
+TIME = np.arange(30, dtype=float)
+VALUES = np.concatenate((np.full(10, 1.0), np.full(10, 2.0), np.full(10, 3.0))) + 0.1 * (TIME % 10)
+STARTS = np.array([0.0, 10.0, 20.0])
+ENDS = np.array([10.0, 20.0, np.inf])
+
+
+def test_unknown_statistic():
+    with pytest.raises(ValueError):
+        EpochEngine(statistic="mode")
+
+
+def test_slices_start_at_the_markers_and_end_before_the_next():
+    first, last = EpochEngine().slices(TIME, STARTS, ENDS)
+
+    np.testing.assert_array_equal(first, [0, 10, 20])
+    np.testing.assert_array_equal(last, [10, 20, 30])
+
+
+def test_slices_drop_the_transition():
+    first, last = EpochEngine(transition=3.5).slices(TIME, STARTS, ENDS)
+
+    np.testing.assert_array_equal(first, [4, 14, 24])
+    np.testing.assert_array_equal(last, [10, 20, 30])
+
+
+def test_slices_of_an_epoch_shorter_than_the_transition_are_empty():
+    first, last = EpochEngine(transition=5.0).slices(TIME, np.array([0.0]), np.array([3.0]))
+
+    assert last[0] == first[0]
+
+
+def test_epoch_samples():
+    values, stamps = EpochEngine(transition=2.0).epoch(VALUES, TIME, 10.0, 20.0)
+
+    np.testing.assert_array_equal(stamps, np.arange(12, 20))
+    np.testing.assert_allclose(values, VALUES[12:20])
+
+
+def test_statistic_uses_the_tail_and_ignores_nan():
+    samples = np.array([100.0, 1.0, np.nan, 3.0])
+
+    assert EpochEngine(tail=3).statistic(samples) == pytest.approx(2.0)
+    assert EpochEngine(tail=None).statistic(samples) == pytest.approx(104.0 / 3)
+    assert EpochEngine(statistic="median", tail=None).statistic(samples) == pytest.approx(3.0)
+    assert np.isnan(EpochEngine().statistic(np.array([np.nan, np.nan])))
+    assert np.isnan(EpochEngine().statistic(np.array([])))
+
+
+def test_variance():
+    samples = np.array([1.0, 2.0, 3.0, np.nan])
+
+    assert EpochEngine(tail=None).variance(samples) == pytest.approx(1.0 / 3)
+    assert EpochEngine(statistic="median", tail=None).variance(samples) == pytest.approx(np.pi / 6)
+    assert np.isnan(EpochEngine().variance(np.array([1.0])))
+
+
+@pytest.mark.parametrize("statistic", EpochEngine.STATISTICS)
+@pytest.mark.parametrize("tail", [None, 3, 50])
+@pytest.mark.parametrize("transition", [0.0, 2.5])
+def test_statistics_match_the_epochs(statistic, tail, transition):
+    engine = EpochEngine(transition=transition, statistic=statistic, tail=tail)
+    values = VALUES.copy()
+    values[[5, 17]] = np.nan
+
+    expected = [engine.statistic(engine.epoch(values, TIME, start, end)[0]) for start, end in zip(STARTS, ENDS)]
+    np.testing.assert_allclose(engine.statistics(values, TIME, STARTS, ENDS), expected)
+
+
+@pytest.mark.parametrize("statistic", EpochEngine.STATISTICS)
+def test_statistics_of_empty_epochs_are_nan(statistic):
+    engine = EpochEngine(transition=5.0, statistic=statistic)
+    values = VALUES.copy()
+    values[20:] = np.nan
+
+    costs = engine.statistics(values, TIME, np.array([0.0, 10.0, 20.0]), np.array([3.0, 20.0, np.inf]))
+
+    assert np.isnan(costs[0])
+    assert costs[1] == pytest.approx(engine.statistic(values[15:20]))
+    assert np.isnan(costs[2])
@@ -0,0 +1,57 @@
+import math
+
+import numpy as np
+import torch
+
+from HIL.optimization.BO import BayesianOptimization
+
+
+X = np.array([[10.0], [35.0], [60.0], [85.0], [50.0], [20.0]])
+Y = -np.sin(X / 15.0)
+
+
+def make_bo(tmp_path, refit_every):
+    torch.manual_seed(0)
+    # no drift refits, only the refit_every schedule
+    return BayesianOptimization(range=np.array([0.0, 100.0]), model_save_path=str(tmp_path),
+                                refit_every=refit_every, mll_drift=math.inf, max_iter=100)
+
+
+def test_new_points_are_conditioned_on_with_the_fitted_hyperparameters(tmp_path):
+    bo = make_bo(tmp_path, refit_every=3)
+    bo.run(X[:4], Y[:4])
+    assert bo.fit_info["fitter"] == "adam"
+
+    bo.run(X[:5], Y[:5])
+    assert bo.fit_info["fitter"] == "incremental"
+    assert len(bo._train_inputs(bo.model)) == 5
+
+    # a GP rebuilt on the same data with the same hyperparameters, without fitting
+    conditioned = bo.model
+    bo._build_model()
+    mean, variance = bo.grid_posterior(conditioned)
+    rebuilt_mean, rebuilt_variance = bo.grid_posterior(bo.model)
+
+    torch.testing.assert_close(mean, rebuilt_mean, rtol=1e-4, atol=1e-6)
+    torch.testing.assert_close(variance, rebuilt_variance, rtol=1e-4, atol=1e-6)
+
+
+def test_refit_every_forces_a_refit(tmp_path):
+    bo = make_bo(tmp_path, refit_every=2)
+    fitters = []
+    for n in range(3, 7):
+        bo.run(X[:n], Y[:n])
+        fitters.append(bo.fit_info["fitter"])
+
+    assert fitters == ["adam", "incremental", "adam", "incremental"]
+
+
+def test_replaced_data_is_refitted(tmp_path):
+    bo = make_bo(tmp_path, refit_every=3)
+    bo.run(X[:4], Y[:4])
+
+    y = Y[:5].copy()
+    y[0] += 1.0
+    bo.run(X[:5], y)
+
+    assert bo.fit_info["fitter"] == "adam"
@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from HIL.optimization.initial_design import InitialDesign
+from HIL.optimization.session_store import SessionStore
+
+
+BOUNDS = np.array([[0.0, 10.0], [85.0, 20.0]])
+
+
+def test_unknown_method():
+    with pytest.raises(ValueError):
+        InitialDesign(BOUNDS, method="grid")
+
+
+@pytest.mark.parametrize("method", InitialDesign.METHODS)
+@pytest.mark.parametrize("n_points", [1, 3, 5, 8])
+def test_point_count_and_bounds(method, n_points):
+    points = InitialDesign(BOUNDS, method=method, seed=0).generate(n_points)
+
+    assert points.shape == (n_points, 2)
+    assert np.all(points >= BOUNDS[0]) and np.all(points <= BOUNDS[1])
+
+
+def test_one_parameter():
+    points = InitialDesign(np.array([[0.0], [85.0]]), seed=0).generate(4)
+
+    assert points.shape == (4, 1)
+    assert len(np.unique(points)) == 4
+
+
+def test_seed_is_reproducible():
+    first = InitialDesign(BOUNDS, seed=3).generate(5)
+    second = InitialDesign(BOUNDS, seed=3).generate(5)
+
+    np.testing.assert_array_equal(first, second)
+
+
+def test_anchors_and_prior_come_first():
+    anchors = np.array([[35.0, 15.0], [75.0, 12.0]])
+    prior = np.array([[10.0, 18.0]])
+    points = InitialDesign(BOUNDS, seed=0).generate(5, anchors=anchors, prior=prior)
+
+    assert points.shape == (5, 2)
+    np.testing.assert_array_equal(points[:3], np.concatenate((anchors, prior)))
+    assert np.all(points >= BOUNDS[0]) and np.all(points <= BOUNDS[1])
+
+
+def test_fixed_points_are_clipped_and_truncated():
+    anchors = np.array([[100.0, 5.0], [35.0, 15.0], [75.0, 12.0]])
+    points = InitialDesign(BOUNDS, seed=0).generate(2, anchors=anchors)
+
+    np.testing.assert_array_equal(points, [[85.0, 10.0], [35.0, 15.0]])
+
+
+def test_free_points_are_away_from_the_anchors():
+    anchor = np.array([[0.0, 10.0]])
+    points = InitialDesign(BOUNDS, seed=0).generate(2, anchors=anchor)
+
+    # the only free point is the candidate farthest from the anchor, near the opposite corner
+    unit = (points[1] - BOUNDS[0]) / (BOUNDS[1] - BOUNDS[0])
+    assert np.all(unit > 0.75)
+
+
+def test_prior_points(tmp_path):
+    store = SessionStore(str(tmp_path / "session_a.jsonl"))
+    for x, y in [(10.0, -5.0), (20.0, float("nan")), (30.0, -1.0), (40.0, None), (30.0, -1.0), (50.0, -3.0)]:
+        store.append({"kind": "bout", "x": [x], "y": y})
+    store.append({"kind": "bout", "x": [1.0, 2.0], "y": 0.0})
+
+    # largest y (lowest cost) first, once per parameter, bouts without a cost or of another size skipped
+    np.testing.assert_array_equal(InitialDesign.prior_points([str(tmp_path)], 3, 1).ravel(), [30.0, 50.0, 10.0])
+    assert InitialDesign.prior_points([str(tmp_path)], 3, 1, exclude=store.path).shape == (0, 1)
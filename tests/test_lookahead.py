@@ -0,0 +1,47 @@
+import math
+
+import numpy as np
+import torch
+
+from HIL.optimization.BO import BayesianOptimization
+
+
+X = np.array([[10.0], [35.0], [60.0], [85.0], [50.0]])
+Y = -np.sin(X / 15.0)
+
+
+def make_bo(tmp_path):
+    torch.manual_seed(0)
+    # the hyperparameters stay fixed for the next point, with or without the lookahead
+    return BayesianOptimization(range=np.array([0.0, 100.0]), model_save_path=str(tmp_path),
+                                refit_every=10, mll_drift=math.inf, max_iter=100)
+
+
+def test_hit_returns_the_candidate_of_a_full_run(tmp_path):
+    speculative, full = make_bo(tmp_path / "speculative"), make_bo(tmp_path / "full")
+    speculative.run(X[:4], Y[:4])
+    full.run(X[:4], Y[:4])
+    speculative.lookahead(X[4], n_outcomes=3)
+
+    y = Y.copy()
+    y[4] = speculative._lookahead["outcomes"][1].item()
+    candidate = speculative.run(X, y)
+    expected = full.run(X, y)
+
+    assert speculative.fit_info["fitter"] == "lookahead"
+    assert full.fit_info["fitter"] == "incremental"
+    np.testing.assert_allclose(candidate, expected, atol=0.1)
+
+
+def test_miss_falls_back_to_a_full_run(tmp_path):
+    bo = make_bo(tmp_path)
+    bo.run(X[:4], Y[:4])
+    bo.lookahead(X[4], n_outcomes=3)
+
+    # another parameter than the pending one
+    x = X.copy()
+    x[4] = 70.0
+    bo.run(x, Y)
+
+    assert bo.fit_info["fitter"] == "incremental"
+    assert bo._lookahead is None
@@ -0,0 +1,201 @@
+import json
+import os
+import numpy as np
+import pytest
+import torch
+
+from HIL.optimization.session_store import SessionStore, load_session, session_paths
+
+
+def _step(store, x, y, **kwargs):
+    store.append_step(np.array(x, dtype=float).reshape(-1, 1), np.array(y, dtype=float).reshape(-1, 1),
+                      {"raw_noise": torch.tensor([0.1])}, np.array([[0.5]]), {"fit": {}}, **kwargs)
+
+
+def test_append_converts_numpy_and_torch(tmp_path):
+    store = SessionStore(str(tmp_path / "sub" / "session_a.jsonl"))
+    store.append({"kind": "bout", "x": np.array([1.0, 2.0]), "y": np.float64(3.0), "t": torch.tensor([4.0])})
+
+    assert list(store.records()) == [{"kind": "bout", "x": [1.0, 2.0], "y": 3.0, "t": [4.0]}]
+
+
+def test_records_filter_by_kind_and_latest(tmp_path):
+    store = SessionStore(str(tmp_path / "session_a.jsonl"))
+    for i in range(3):
+        store.append({"kind": "bout", "n": i})
+        store.append({"kind": "plan", "n": i})
+
+    assert [record["n"] for record in store.records("bout")] == [0, 1, 2]
+    assert store.latest()["kind"] == "plan"
+    assert store.latest("bout")["n"] == 2
+    assert store.latest("step") is None
+
+
+def test_missing_file_has_no_records(tmp_path):
+    store = SessionStore(str(tmp_path / "session_a.jsonl"))
+
+    assert list(store.records()) == []
+    assert store.latest() is None
+    assert store.load() is None
+
+
+def test_append_step_stores_only_new_observations(tmp_path):
+    store = SessionStore(str(tmp_path / "session_a.jsonl"))
+    _step(store, [1, 2], [10, 20])
+    _step(store, [1, 2, 3], [10, 20, 30])
+
+    steps = list(store.records("step"))
+    assert [step["iteration"] for step in steps] == [0, 1]
+    assert [step["start"] for step in steps] == [0, 2]
+    assert steps[1]["x"] == [[3.0]]
+
+
+def test_load_replays_steps(tmp_path):
+    store = SessionStore(str(tmp_path / "session_a.jsonl"))
+    _step(store, [1], [10])
+    _step(store, [1, 2], [10, 20])
+    _step(store, [1, 2, 3], [10, 20, 30])
+
+    latest = store.load()
+    assert latest["iteration"] == 2
+    np.testing.assert_array_equal(latest["x"].ravel(), [1, 2, 3])
+    np.testing.assert_array_equal(latest["y"].ravel(), [10, 20, 30])
+    assert torch.allclose(latest["hyperparameters"]["raw_noise"].float(), torch.tensor([0.1]))
+
+    second = store.load(iteration=1)
+    np.testing.assert_array_equal(second["x"].ravel(), [1, 2])
+    assert store.load(iteration=5) is None
+
+
+def test_load_after_the_data_is_replaced(tmp_path):
+    store = SessionStore(str(tmp_path / "session_a.jsonl"))
+    _step(store, [1, 2, 3], [10, 20, 30])
+    # fewer observations than stored, the step holds all of them
+    _step(store, [4], [40])
+
+    assert list(store.records("step"))[1]["start"] == 0
+    np.testing.assert_array_equal(store.load()["x"].ravel(), [4])
+
+
+@pytest.mark.parametrize("x, y", [
+    ([9, 9, 3], [90, 90, 30]), # longer
+    ([9, 2], [10, 20]), # same length
+    ([1, 2], [10, 99]), # other costs
+])
+def test_load_after_the_stored_observations_are_replaced(tmp_path, x, y):
+    store = SessionStore(str(tmp_path / "session_a.jsonl"))
+    _step(store, [1, 2], [10, 20])
+    _step(store, x, y)
+
+    assert list(store.records("step"))[1]["start"] == 0
+    np.testing.assert_array_equal(store.load()["x"].ravel(), x)
+    np.testing.assert_array_equal(store.load()["y"].ravel(), y)
+
+
+def test_reopened_store_checks_the_stored_observations(tmp_path):
+    path = str(tmp_path / "session_a.jsonl")
+    _step(SessionStore(path), [1, 2], [10, 20])
+
+    store = SessionStore(path)
+    _step(store, [1, 2, 3], [10, 20, 30])
+    assert list(store.records("step"))[1]["start"] == 2
+    _step(SessionStore(path), [9, 9, 3, 4], [10, 20, 30, 40])
+    np.testing.assert_array_equal(store.load()["x"].ravel(), [9, 9, 3, 4])
+
+
+def test_load_noise_variances(tmp_path):
+    store = SessionStore(str(tmp_path / "session_a.jsonl"))
+    _step(store, [1], [10], y_var=np.array([[0.1]]))
+    _step(store, [1, 2], [10, 20], y_var=np.array([[0.1], [0.2]]))
+
+    np.testing.assert_array_equal(store.load()["y_var"].ravel(), [0.1, 0.2])
+
+
+def test_load_fidelity(tmp_path):
+    store = SessionStore(str(tmp_path / "session_a.jsonl"))
+    _step(store, [1], [10], fidelity=np.array([[0]]))
+    _step(store, [1, 2], [10, 20], fidelity=np.array([[0], [1]]))
+
+    np.testing.assert_array_equal(store.load()["fidelity"].ravel(), [0, 1])
+    assert store.load()["y_var"] is None
+
+
+def test_noise_known_from_a_later_step_rewrites_the_observations(tmp_path):
+    store = SessionStore(str(tmp_path / "session_a.jsonl"))
+    _step(store, [1], [10])
+    _step(store, [1, 2], [10, 20], y_var=np.array([[0.1], [0.2]]))
+
+    assert list(store.records("step"))[1]["start"] == 0
+    np.testing.assert_array_equal(store.load()["y_var"].ravel(), [0.1, 0.2])
+
+
+def test_noise_unknown_for_earlier_observations(tmp_path):
+    store = SessionStore(str(tmp_path / "session_a.jsonl"))
+    store.append({"kind": "step", "iteration": 0, "start": 0, "x": [[1.0]], "y": [[10.0]], "y_var": None,
+                  "hyperparameters": {}, "proposed": [[0.5]], "timings": {}})
+    store.append({"kind": "step", "iteration": 1, "start": 1, "x": [[2.0]], "y": [[20.0]], "y_var": [[0.2]],
+                  "hyperparameters": {}, "proposed": [[0.5]], "timings": {}})
+
+    assert store.load()["y_var"] is None
+
+
+def test_torn_tail_is_skipped_and_the_next_record_starts_a_new_line(tmp_path):
+    store = SessionStore(str(tmp_path / "session_a.jsonl"))
+    _step(store, [1], [10])
+    _step(store, [1, 2], [10, 20])
+    # crash while writing the third step
+    with open(store.path, "a") as f:
+        f.write('{"kind": "step", "iteration": 2, "start": 2, "x": [[3.0')
+
+    assert [step["iteration"] for step in store.records("step")] == [0, 1]
+    assert store.latest("step")["iteration"] == 1
+    assert store.load()["iteration"] == 1
+
+    _step(store, [1, 2, 3], [10, 20, 30])
+    assert [step["iteration"] for step in store.records("step")] == [0, 1, 2]
+    np.testing.assert_array_equal(store.load()["x"].ravel(), [1, 2, 3])
+    with open(store.path) as f:
+        lines = f.read().splitlines()
+    assert len(lines) == 4
+    json.loads(lines[-1])
+
+
+def test_latest_reads_records_longer_than_a_block(tmp_path):
+    store = SessionStore(str(tmp_path / "session_a.jsonl"))
+    store.append({"kind": "bout", "n": 0})
+    store.append({"kind": "plan", "plan": list(range(5000))})
+
+    assert len(store.latest("plan")["plan"]) == 5000
+    assert store.latest("bout")["n"] == 0
+
+
+def test_new_path_is_unique(tmp_path):
+    first = SessionStore.new_path(str(tmp_path))
+    second = SessionStore.new_path(str(tmp_path))
+
+    assert first != second
+    assert os.path.basename(first).startswith("session_")
+    assert first.endswith(".jsonl")
+
+
+def test_latest_path(tmp_path):
+    assert SessionStore.latest_path(str(tmp_path)) is None
+    for name in ("session_20240101_120000.jsonl", "session_20240102_090000.jsonl", "other.jsonl"):
+        (tmp_path / name).write_text("")
+
+    assert SessionStore.latest_path(str(tmp_path)) == str(tmp_path / "session_20240102_090000.jsonl")
+
+
+def test_session_paths_and_load_session(tmp_path):
+    store = SessionStore(str(tmp_path / "session_a.jsonl"))
+    _step(store, [1, 2], [10, 20])
+    SessionStore(str(tmp_path / "session_b.jsonl")).append({"kind": "bout"})
+
+    paths = session_paths([str(tmp_path)])
+    assert paths == [store.path, str(tmp_path / "session_b.jsonl")]
+
+    x, y, state = load_session(store.path)
+    np.testing.assert_array_equal(x.ravel(), [1, 2])
+    np.testing.assert_array_equal(y, [10, 20])
+    assert "raw_noise" in state
+    assert load_session(paths[1]) is None
@@ -0,0 +1,114 @@
+import pytest
+import torch
+
+from HIL.optimization.trust_region import TrustRegion
+
+
+BETTER = torch.tensor([[2.0]])
+WORSE = torch.tensor([[0.0]])
+RANGE = torch.tensor([[0.0, 0.0], [10.0, 20.0]], dtype=torch.double)
+
+
+def test_failure_tolerance_defaults_to_the_number_of_parameters():
+    assert TrustRegion(2).failure_tolerance == 4
+    assert TrustRegion(6).failure_tolerance == 6
+    assert TrustRegion(2, failure_tolerance=2).failure_tolerance == 2
+
+
+def test_expands_after_success_tolerance_improvements():
+    region = TrustRegion(2, length=0.4, success_tolerance=3)
+    for _ in range(2):
+        region.update(BETTER, best=1.0)
+    assert region.length == 0.4
+
+    region.update(BETTER, best=1.0)
+    assert region.length == 0.8
+    assert region.n_success == 0
+
+
+def test_expansion_is_capped():
+    region = TrustRegion(2, length=1.2, max_length=1.6, success_tolerance=1)
+    region.update(BETTER, best=1.0)
+
+    assert region.length == 1.6
+
+
+def test_shrinks_after_failure_tolerance_steps_without_improvement():
+    region = TrustRegion(2, length=0.8, failure_tolerance=2)
+    region.update(WORSE, best=1.0)
+    assert region.length == 0.8
+
+    region.update(WORSE, best=1.0)
+    assert region.length == 0.4
+    assert region.n_failure == 0
+
+
+def test_a_success_resets_the_failures_and_a_failure_the_successes():
+    region = TrustRegion(2, length=0.8, success_tolerance=2, failure_tolerance=2)
+    region.update(WORSE, best=1.0)
+    region.update(BETTER, best=1.0)
+    assert (region.n_success, region.n_failure) == (1, 0)
+
+    region.update(WORSE, best=1.0)
+    assert (region.n_success, region.n_failure) == (0, 1)
+    assert region.length == 0.8
+
+
+def test_small_improvements_are_failures():
+    region = TrustRegion(2, min_improvement=0.1)
+    region.update(torch.tensor([[1.05]]), best=1.0)
+
+    assert region.n_failure == 1
+
+
+def test_restarts_below_min_length():
+    region = TrustRegion(2, length=0.8, min_length=0.3, failure_tolerance=1)
+    region.update(WORSE, best=1.0)
+    assert region.length == 0.4
+
+    region.update(WORSE, best=1.0)
+    assert region.length == 0.8
+    assert region.n_restarts == 1
+
+
+def test_bounds_around_the_center():
+    bounds = TrustRegion(2, length=0.2).bounds(torch.tensor([5.0, 10.0], dtype=torch.double), RANGE)
+
+    assert torch.allclose(bounds, torch.tensor([[4.0, 8.0], [6.0, 12.0]], dtype=torch.double))
+    assert TrustRegion.volume(bounds, RANGE) == pytest.approx(0.04)
+
+
+def test_bounds_are_clipped_to_the_range():
+    bounds = TrustRegion(2, length=0.8).bounds(torch.tensor([1.0, 19.0], dtype=torch.double), RANGE)
+
+    assert torch.allclose(bounds, torch.tensor([[0.0, 11.0], [5.0, 20.0]], dtype=torch.double))
+
+
+def test_bounds_follow_the_lengthscales_with_the_same_volume():
+    region = TrustRegion(2, length=0.2)
+    center = torch.tensor([5.0, 10.0], dtype=torch.double)
+    bounds = region.bounds(center, RANGE, lengthscale=torch.tensor([0.4, 0.1]))
+
+    side = (bounds[1] - bounds[0]) / (RANGE[1] - RANGE[0])
+    assert side[0] == pytest.approx(0.4)
+    assert side[1] == pytest.approx(0.1)
+    assert TrustRegion.volume(bounds, RANGE) == pytest.approx(0.04)
+
+
+def test_budget_scales_with_the_volume():
+    region = TrustRegion(2)
+
+    assert region.budget(16, 512, 1.0) == (16, 512)
+    assert region.budget(16, 512, 0.25) == (4, 128)
+    # at least 2 restarts and as many raw samples
+    assert region.budget(16, 512, 0.001) == (2, 2)
+
+
+def test_state_round_trip():
+    region = TrustRegion(2, failure_tolerance=1)
+    region.update(WORSE, best=1.0)
+    region.update(BETTER, best=1.0)
+
+    restored = TrustRegion(2)
+    restored.load(region.state())
+    assert restored.state() == region.state()